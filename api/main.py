@@ -2,17 +2,21 @@
 FastAPI backend for PyPI package management with intelligent caching
 """
 
-from fastapi import FastAPI, HTTPException, Query, BackgroundTasks, Request
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Query, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
+from pydantic import BaseModel, Field, TypeAdapter
+from typing import List, Optional, Dict, Any, Tuple
 import httpx
 import asyncio
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import logging
 from contextlib import asynccontextmanager
 import time
+import hashlib
+import orjson
+from cachetools import TTLCache
 
 from services.pypi_client import PyPIClient
 from services.package_service import PackageService
@@ -50,76 +54,90 @@ logging.getLogger("httpx").setLevel(logging.WARNING)
 # Keep important database/cache logs at info level
 logging.getLogger("services").setLevel(logging.INFO)
 
-# Initialize services
-pypi_client = PyPIClient()
-cache_service = CacheService()
-package_service = PackageService(pypi_client, cache_service)
+# ISO timestamp rendered at most once per second
+_last_timestamp: Tuple[int, str] = (0, "")
+
+def _iso_now() -> str:
+    """Current UTC time as an ISO string, cached to second granularity"""
+    global _last_timestamp
+    now = int(time.time())
+    if _last_timestamp[0] != now:
+        _last_timestamp = (now, datetime.now(timezone.utc).isoformat())
+    return _last_timestamp[1]
+
+# Serializes version lists in one pydantic-core pass
+versions_adapter = TypeAdapter(List[VersionInfo])
 
 # Request deduplication for dependency resolution
 from asyncio import Event
-from typing import Tuple
-resolution_cache: Dict[str, Tuple[Event, Any]] = {}
+# cache_key -> serialized result of a finished resolution, kept for 1 minute
+resolution_cache: TTLCache = TTLCache(maxsize=1024, ttl=60)
+# cache_key -> [Event, serialized result] for resolutions still running; a plain
+# dict so an entry can't expire or be evicted while its owner is working
+resolution_in_flight: Dict[str, List[Any]] = {}
 resolution_lock = asyncio.Lock()
 
+# Memoized /api/health response so frequent probes don't hit the database
+HEALTH_SNAPSHOT_TTL = 5.0  # seconds
+health_snapshot: List[Any] = [0.0, None]  # [monotonic timestamp, HealthResponse]
+health_lock = asyncio.Lock()
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan events"""
     # Startup
     logger.info("Starting PyPI API backend...")
-    await cache_service.initialize()
+    await app.state.cache_service.initialize()
+    await app.state.package_service.startup()
     
     # Start background tasks for cache warming
-    asyncio.create_task(package_service.warm_popular_packages())
+    warm_task = asyncio.create_task(app.state.package_service.warm_popular_packages())
     
     yield
     
     # Shutdown
     logger.info("Shutting down PyPI API backend...")
-    await cache_service.close()
-    await pypi_client.close()
-
-app = FastAPI(
-    title="PyPI Requirements Manager API",
-    description="Intelligent PyPI package management with caching and dependency resolution",
-    version="1.0.0",
-    lifespan=lifespan
-)
+    warm_task.cancel()
+    try:
+        await warm_task
+    except asyncio.CancelledError:
+        pass
+    await app.state.cache_service.close()
+    await app.state.package_service.shutdown()
 
-# Configure CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:5173", "http://localhost:3000", "https://py-reqforge.vercel.app"],  # React dev servers
-    allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE"],
-    allow_headers=["*"],
-)
+router = APIRouter()
 
-# Custom logging middleware to reduce noise
-@app.middleware("http")
-async def logging_middleware(request: Request, call_next):
-    start_time = time.time()
-    
-    # Skip logging for health checks and frequent polling endpoints
-    skip_logging = request.url.path in ["/api/health", "/health", "/"]
-    
-    response = await call_next(request)
-    process_time = time.time() - start_time
-    
-    # Only log errors, slow requests, or manual API calls
-    should_log = (
-        response.status_code >= 400 or  # Errors
-        process_time > 1.0 or          # Slow requests (> 1 second)
-        not skip_logging               # Non-health check endpoints
-    )
+# Health checks and frequent polling endpoints bypass request logging
+SKIP_PATHS = frozenset({"/api/health", "/health", "/"})
+
+class LoggingMiddleware:
+    """Pure ASGI request logging middleware (avoids BaseHTTPMiddleware overhead)"""
     
-    if should_log:
-        level = logging.ERROR if response.status_code >= 400 else logging.INFO
-        logger.log(
-            level,
-            f"{request.method} {request.url.path} - {response.status_code} - {process_time:.2f}s"
-        )
+    def __init__(self, app):
+        self.app = app
     
-    return response
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in SKIP_PATHS:
+            return await self.app(scope, receive, send)
+        
+        start_time = time.perf_counter()
+        status_code = 500
+        
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            process_time = time.perf_counter() - start_time
+            level = logging.ERROR if status_code >= 400 else logging.INFO
+            logger.log(
+                level,
+                f"{scope['method']} {scope['path']} - {status_code} - {process_time:.2f}s"
+            )
 
 class HealthResponse(BaseModel):
     status: str
@@ -136,8 +154,9 @@ class DependencyResolutionRequest(BaseModel):
     packages: List[str] = Field(..., description="List of package specifications")
     index_url: Optional[str] = Field(None, description="Custom package index URL")
     python_version: Optional[str] = Field("3.9", description="Target Python version")
+    top_n: Optional[int] = Field(None, ge=1, description="Only look up hashes for this many packages, main packages first")
 
-@app.get("/", response_model=Dict[str, str])
+@router.get("/", response_model=Dict[str, str])
 async def root():
     """Root endpoint with API information"""
     return {
@@ -146,30 +165,48 @@ async def root():
         "documentation": "/docs"
     }
 
-@app.get("/health")
+@router.get("/health")
 async def simple_health_check():
     """Simple health check endpoint for Render"""
     return {"status": "ok"}
 
-@app.get("/api/health", response_model=HealthResponse)
-async def health_check():
+@router.get("/api/health", response_model=HealthResponse)
+async def health_check(request: Request):
     """Health check endpoint with detailed status"""
-    try:
-        db_status = await cache_service.health_check()
-        cache_stats = await cache_service.get_cache_stats()
+    timestamp, snapshot = health_snapshot
+    if snapshot and time.monotonic() - timestamp < HEALTH_SNAPSHOT_TTL:
+        return snapshot
+    
+    async with health_lock:
+        # Another request may have refreshed the snapshot while we waited
+        timestamp, snapshot = health_snapshot
+        if snapshot and time.monotonic() - timestamp < HEALTH_SNAPSHOT_TTL:
+            return snapshot
         
-        return HealthResponse(
-            status="healthy",
-            timestamp=datetime.utcnow().isoformat(),
-            database_status=db_status,
-            cache_stats=cache_stats
-        )
-    except Exception as e:
-        logger.error(f"Health check failed: {e}")
-        raise HTTPException(status_code=503, detail="Service unhealthy")
+        try:
+            cache_service = request.app.state.cache_service
+            db_status = await cache_service.health_check()
+            cache_stats = await cache_service.get_cache_stats()
+            
+            snapshot = HealthResponse(
+                status="healthy",
+                timestamp=_iso_now(),
+                database_status=db_status,
+                cache_stats=cache_stats
+            )
+        except Exception as e:
+            logger.error(f"Health check failed: {e}")
+            raise HTTPException(status_code=503, detail="Service unhealthy")
+        
+        health_snapshot[:] = [time.monotonic(), snapshot]
+        return snapshot
 
-@app.get("/api/packages/search", response_model=List[PackageSearchResult])
+@router.get(
+    "/api/packages/search",
+    responses={200: {"model": List[PackageSearchResult]}}
+)
 async def search_packages(
+    request: Request,
     q: str = Query(..., min_length=1, max_length=100, description="Search query"),
     index_url: Optional[str] = Query(None, description="Custom package index URL"),
     limit: int = Query(10, ge=1, le=50, description="Maximum number of results")
@@ -181,18 +218,25 @@ async def search_packages(
     live PyPI search if needed. Results are cached for performance.
     """
     try:
-        results = await package_service.search_packages(
+        results = await request.app.state.package_service.search_packages(
             query=q,
             index_url=index_url,
-            limit=limit
+            limit=limit,
+            # Incremental search narrows each client's own previous results
+            client_id=request.client.host if request.client else None
         )
-        return results
+        # Results are already JSON-ready dicts; skip response_model re-validation
+        return ORJSONResponse(content=results)
     except Exception as e:
         logger.error(f"Package search failed: {e}")
         raise HTTPException(status_code=500, detail="Search failed")
 
-@app.get("/api/packages/{package_name}", response_model=PackageDetails)
+@router.get(
+    "/api/packages/{package_name}",
+    responses={200: {"model": PackageDetails}}
+)
 async def get_package_details(
+    request: Request,
     package_name: str,
     index_url: Optional[str] = Query(None, description="Custom package index URL"),
     include_versions: bool = Query(True, description="Include version history"),
@@ -205,7 +249,7 @@ async def get_package_details(
     and project information. Data is cached and updated intelligently.
     """
     try:
-        package_details = await package_service.get_package_details(
+        package_details = await request.app.state.package_service.get_package_details(
             package_name=package_name,
             index_url=index_url,
             include_versions=include_versions,
@@ -215,38 +259,45 @@ async def get_package_details(
         if not package_details:
             raise HTTPException(status_code=404, detail="Package not found")
             
-        return package_details
+        return ORJSONResponse(content=package_details.model_dump(mode="json"))
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Failed to get package details for {package_name}: {e}")
         raise HTTPException(status_code=500, detail="Failed to retrieve package details")
 
-@app.get("/api/packages/{package_name}/versions", response_model=List[VersionInfo])
+@router.get(
+    "/api/packages/{package_name}/versions",
+    responses={200: {"model": List[VersionInfo]}}
+)
 async def get_package_versions(
+    request: Request,
     package_name: str,
     index_url: Optional[str] = Query(None, description="Custom package index URL"),
-    include_yanked: bool = Query(False, description="Include yanked versions")
+    include_yanked: bool = Query(False, description="Include yanked versions"),
+    limit: Optional[int] = Query(None, ge=1, description="Only return the newest N versions")
 ):
     """
     Get all available versions for a package
     
-    Returns a list of all versions with metadata, optionally including
-    yanked (removed) versions.
+    Returns a list of all versions with metadata, newest first, optionally
+    including yanked (removed) versions.
     """
     try:
-        versions = await package_service.get_package_versions(
+        versions = await request.app.state.package_service.get_package_versions(
             package_name=package_name,
             index_url=index_url,
-            include_yanked=include_yanked
+            include_yanked=include_yanked,
+            limit=limit
         )
-        return versions
+        return ORJSONResponse(content=versions_adapter.dump_python(versions, mode="json"))
     except Exception as e:
         logger.error(f"Failed to get versions for {package_name}: {e}")
         raise HTTPException(status_code=500, detail="Failed to retrieve package versions")
 
-@app.get("/api/packages/{package_name}/{version}", response_model=VersionInfo)
+@router.get("/api/packages/{package_name}/{version}", response_model=VersionInfo)
 async def get_specific_version(
+    request: Request,
     package_name: str,
     version: str,
     index_url: Optional[str] = Query(None, description="Custom package index URL")
@@ -258,7 +309,7 @@ async def get_specific_version(
     dependencies, file information, and release details.
     """
     try:
-        version_info = await package_service.get_version_details(
+        version_info = await request.app.state.package_service.get_version_details(
             package_name=package_name,
             version=version,
             index_url=index_url
@@ -274,8 +325,18 @@ async def get_specific_version(
         logger.error(f"Failed to get version {version} for {package_name}: {e}")
         raise HTTPException(status_code=500, detail="Failed to retrieve version details")
 
-@app.post("/api/packages/resolve-dependencies", response_model=Dict[str, Any])
-async def resolve_dependencies(request: DependencyResolutionRequest):
+def _normalize_spec(spec: str) -> str:
+    """Normalize a package spec so equivalent spellings share a cache key"""
+    return spec.strip().lower().replace(' ', '')
+
+def _resolution_cache_key(request: DependencyResolutionRequest) -> str:
+    """Build a fixed-size deduplication key for a resolution request"""
+    normalized = tuple(sorted(_normalize_spec(p) for p in request.packages))
+    key_bytes = repr((normalized, request.index_url or '', request.python_version or '', request.top_n)).encode()
+    return hashlib.blake2b(key_bytes, digest_size=16).hexdigest()
+
+@router.post("/api/packages/resolve-dependencies")
+async def resolve_dependencies(request: Request, resolution_request: DependencyResolutionRequest):
     """
     Resolve dependencies for a list of packages with request deduplication
     
@@ -283,68 +344,67 @@ async def resolve_dependencies(request: DependencyResolutionRequest):
     dependency tree with version constraints resolved.
     """
     # Create cache key for deduplication
-    cache_key = f"{sorted(request.packages)}:{request.index_url}:{request.python_version}"
+    cache_key = _resolution_cache_key(resolution_request)
     
     async with resolution_lock:
-        if cache_key in resolution_cache:
-            # Wait for existing resolution to complete
-            event, result = resolution_cache[cache_key]
-            logger.info(f"Waiting for existing resolution: {cache_key}")
-        else:
+        result = resolution_cache.get(cache_key)
+        if result is not None:
+            # Return cached result without re-serializing it
+            return Response(content=result, media_type="application/json")
+        
+        entry = resolution_in_flight.get(cache_key)
+        is_owner = entry is None
+        if is_owner:
             # Create new resolution task
-            event = Event()
-            resolution_cache[cache_key] = (event, None)
+            entry = [Event(), None]
+            resolution_in_flight[cache_key] = entry
             logger.info(f"Starting new resolution: {cache_key}")
+        else:
+            logger.info(f"Waiting for existing resolution: {cache_key}")
+        event = entry[0]
     
-    if cache_key in resolution_cache and resolution_cache[cache_key][1] is not None:
-        # Return cached result
-        _, result = resolution_cache[cache_key]
-        return result
+    if not is_owner:
+        # Wait for the owning request to finish, outside the lock
+        await event.wait()
+        if entry[1] is None:
+            raise HTTPException(status_code=500, detail="Dependency resolution failed")
+        return Response(content=entry[1], media_type="application/json")
     
     try:
         # Perform resolution
-        resolution = await package_service.resolve_dependencies(
-            packages=request.packages,
-            index_url=request.index_url,
-            python_version=request.python_version
+        resolution = await request.app.state.package_service.resolve_dependencies(
+            packages=resolution_request.packages,
+            index_url=resolution_request.index_url,
+            python_version=resolution_request.python_version,
+            top_n=resolution_request.top_n
         )
         
-        # Convert Pydantic model to dict to avoid FastAPI validation error
-        result = resolution.dict()
+        # Serialize once; cache hits and waiters reuse the same bytes
+        result = orjson.dumps(resolution.dict())
         
         # Cache result and notify waiters
         async with resolution_lock:
-            if cache_key in resolution_cache:
-                event, _ = resolution_cache[cache_key]
-                resolution_cache[cache_key] = (event, result)
-                event.set()
-                
-                # Clean up after 60 seconds
-                asyncio.create_task(cleanup_resolution_cache(cache_key))
+            entry[1] = result
+            resolution_cache[cache_key] = result
+            event.set()
         
-        return result
+        return Response(content=result, media_type="application/json")
         
     except Exception as e:
         logger.error(f"Dependency resolution failed: {e}")
-        
-        # Clean up failed resolution
-        async with resolution_lock:
-            if cache_key in resolution_cache:
-                event, _ = resolution_cache[cache_key]
-                event.set()
-                del resolution_cache[cache_key]
-        
         raise HTTPException(status_code=500, detail="Dependency resolution failed")
+        
+    finally:
+        # Also runs when failed or cancelled (client disconnect, shutdown), so
+        # waiters are always woken and none of them blocks forever. There is
+        # no await in between, so this needs no lock and can't be interrupted.
+        if resolution_in_flight.get(cache_key) is entry:
+            del resolution_in_flight[cache_key]
+        event.set()
 
-async def cleanup_resolution_cache(cache_key: str):
-    """Clean up resolution cache after delay"""
-    await asyncio.sleep(60)  # Cache for 1 minute
-    async with resolution_lock:
-        if cache_key in resolution_cache:
-            del resolution_cache[cache_key]
-
-@app.post("/api/cache/refresh")
+@router.post("/api/cache/refresh")
 async def refresh_cache(
+    request: Request,
     background_tasks: BackgroundTasks,
     package_name: Optional[str] = Query(None, description="Specific package to refresh"),
     index_url: Optional[str] = Query(None, description="Custom package index URL")
@@ -355,6 +415,7 @@ async def refresh_cache(
     Triggers a background refresh of cached data. Can refresh specific
     packages or the entire cache.
     """
+    package_service = request.app.state.package_service
     if package_name:
         background_tasks.add_task(
             package_service.refresh_package_cache,
@@ -369,8 +430,8 @@ async def refresh_cache(
         )
         return {"message": "Full cache refresh triggered"}
 
-@app.get("/api/cache/stats", response_model=Dict[str, Any])
-async def get_cache_stats():
+@router.get("/api/cache/stats")
+async def get_cache_stats(request: Request):
     """
     Get cache statistics and performance metrics
     
@@ -378,53 +439,63 @@ async def get_cache_stats():
     and other performance metrics.
     """
     try:
-        stats = await cache_service.get_detailed_stats()
-        return stats
+        stats = await request.app.state.cache_service.get_detailed_stats()
+        return ORJSONResponse(content=stats)
     except Exception as e:
         logger.error(f"Failed to get cache stats: {e}")
         raise HTTPException(status_code=500, detail="Failed to retrieve cache statistics")
 
-@app.delete("/api/cache/clear")
+def _require_confirm(confirm: bool = Query(False, description="Confirmation required")) -> bool:
+    """Reject unconfirmed cache clears before the route handler runs"""
+    if not confirm:
+        raise HTTPException(
+            status_code=400, 
+            detail="Confirmation required. Add ?confirm=true to proceed."
+        )
+    return True
+
+@router.delete("/api/cache/clear")
 async def clear_cache(
-    confirm: bool = Query(False, description="Confirmation required"),
+    request: Request,
+    background_tasks: BackgroundTasks,
+    _: bool = Depends(_require_confirm),
     package_name: Optional[str] = Query(None, description="Specific package to clear")
 ):
     """
     Clear cached data
     
     Clears cached package data. Requires confirmation parameter.
-    Can clear specific packages or entire cache.
+    Can clear specific packages (in the background) or entire cache.
     """
-    if not confirm:
-        raise HTTPException(
-            status_code=400, 
-            detail="Confirmation required. Add ?confirm=true to proceed."
-        )
+    cache_service = request.app.state.cache_service
+    request.app.state.package_service.invalidate(package_name)
+    if package_name:
+        background_tasks.add_task(cache_service.clear_package_cache, package_name)
+        return {"message": f"Cache clear scheduled for {package_name}"}
     
     try:
-        if package_name:
-            await cache_service.clear_package_cache(package_name)
-            return {"message": f"Cache cleared for {package_name}"}
-        else:
-            await cache_service.clear_all_cache()
-            return {"message": "All cache cleared"}
+        await cache_service.clear_all_cache()
+        return {"message": "All cache cleared"}
     except Exception as e:
         logger.error(f"Failed to clear cache: {e}")
         raise HTTPException(status_code=500, detail="Failed to clear cache")
 
-@app.get("/api/indexes/validate")
-async def validate_index(index_url: str = Query(..., description="Package index URL to validate")):
+@router.get("/api/indexes/validate")
+async def validate_index(
+    request: Request,
+    index_url: str = Query(..., description="Package index URL to validate")
+):
     """
     Validate a custom package index
     
     Checks if a custom package index is accessible and compatible.
     """
     try:
-        is_valid = await package_service.validate_index(index_url)
+        is_valid = await request.app.state.package_service.validate_index(index_url)
         return {
             "index_url": index_url,
             "valid": is_valid,
-            "checked_at": datetime.utcnow().isoformat()
+            "checked_at": _iso_now()
         }
     except Exception as e:
         logger.error(f"Index validation failed for {index_url}: {e}")
@@ -432,15 +503,58 @@ async def validate_index(index_url: str = Query(..., description="Package index
             "index_url": index_url,
             "valid": False,
             "error": str(e),
-            "checked_at": datetime.utcnow().isoformat()
+            "checked_at": _iso_now()
         }
 
+def app_factory() -> FastAPI:
+    """
+    Build a fully configured application
+    
+    Services live on app.state rather than module globals so each worker
+    process constructs its own database connection and HTTP pool.
+    """
+    app = FastAPI(
+        title="PyPI Requirements Manager API",
+        description="Intelligent PyPI package management with caching and dependency resolution",
+        version="1.0.0",
+        lifespan=lifespan,
+        default_response_class=ORJSONResponse
+    )
+    
+    # Configure CORS
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["http://localhost:5173", "http://localhost:3000", "https://py-reqforge.vercel.app"],  # React dev servers
+        allow_credentials=True,
+        allow_methods=["GET", "POST", "PUT", "DELETE"],
+        allow_headers=["*"],
+    )
+    
+    # Compress large JSON payloads (package details, version lists, stats)
+    app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+    
+    # Custom logging middleware to reduce noise
+    app.add_middleware(LoggingMiddleware)
+    
+    # Initialize services
+    pypi_client = PyPIClient()
+    cache_service = CacheService()
+    app.state.pypi_client = pypi_client
+    app.state.cache_service = cache_service
+    app.state.package_service = PackageService(pypi_client, cache_service)
+    
+    app.include_router(router)
+    return app
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
-        "main:app",
+        "main:app_factory",
+        factory=True,
         host="0.0.0.0",
         port=8000,
         reload=True,
+        loop="uvloop",
+        http="httptools",
         log_level="warning"  # Reduce noise from Prisma and other dependencies
     )
@@ -2,12 +2,20 @@
 Pydantic models for package data structures
 """
 
-from pydantic import BaseModel, Field, validator
-from typing import List, Optional, Dict, Any, Union
+from pydantic import BaseModel, ConfigDict, Field, StringConstraints
+from typing import List, Optional, Dict, Any, Set
+from typing_extensions import Annotated
 from datetime import datetime
 
+# Name types validated in pydantic-core instead of Python-level validators
+DependencyName = Annotated[str, StringConstraints(strip_whitespace=True, min_length=1)]
+PackageName = Annotated[str, StringConstraints(strip_whitespace=True, to_lower=True, min_length=1)]
+
 class FileInfo(BaseModel):
     """Information about a package file (wheel, tarball, etc.)"""
+    # Built in bulk during resolution and never mutated afterwards
+    model_config = ConfigDict(frozen=True)
+    
     filename: str
     url: str
     size: Optional[int] = None
@@ -21,19 +29,17 @@ class FileInfo(BaseModel):
 
 class DependencyInfo(BaseModel):
     """Information about a package dependency"""
-    name: str
+    model_config = ConfigDict(frozen=True)
+    
+    name: DependencyName
     version_spec: Optional[str] = None  # e.g., ">=1.0.0,<2.0.0"
     optional: bool = False
     extra: Optional[str] = None  # Optional dependency group
-    
-    @validator('name')
-    def validate_name(cls, v):
-        if not v or not isinstance(v, str):
-            raise ValueError('Dependency name must be a non-empty string')
-        return v.strip()
 
 class VersionInfo(BaseModel):
     """Detailed information about a specific package version"""
+    model_config = ConfigDict(frozen=True)
+    
     version: str
     release_date: Optional[datetime] = None
     yanked: bool = False
@@ -76,7 +82,7 @@ class PackageSearchResult(BaseModel):
 
 class PackageDetails(BaseModel):
     """Comprehensive package information"""
-    name: str
+    name: PackageName
     summary: Optional[str] = None
     description: Optional[str] = None
     
@@ -109,12 +115,6 @@ class PackageDetails(BaseModel):
     # Timestamps
     first_release: Optional[datetime] = None
     last_updated: Optional[datetime] = None
-    
-    @validator('name')
-    def validate_name(cls, v):
-        if not v or not isinstance(v, str):
-            raise ValueError('Package name must be a non-empty string')
-        return v.strip().lower()
 
 class DependencyTree(BaseModel):
     """Represents a resolved dependency tree"""
@@ -122,13 +122,67 @@ class DependencyTree(BaseModel):
     version: str
     dependencies: List['DependencyTree'] = []
     
-    class Config:
-        # Allow forward references for recursive model
-        arbitrary_types_allowed = True
+    # Allow forward references for recursive model
+    model_config = ConfigDict(arbitrary_types_allowed=True)
 
 # Update forward references
 DependencyTree.model_rebuild()
 
+class ResolvedNode(BaseModel):
+    """A package in a flattened dependency graph"""
+    name: str
+    version: str
+    dep_indices: List[int] = []  # indices into ResolutionPayload.nodes
+
+class ResolutionPayload(BaseModel):
+    """Flat dependency graph; packages shared by several parents appear once"""
+    nodes: List[ResolvedNode] = []
+    roots: List[int] = []
+    
+    def to_tree(self, max_depth: int) -> List[DependencyTree]:
+        """
+        Rebuild the nested DependencyTree view used by the API response
+        
+        Nodes at depth < max_depth are expanded; a node already on the
+        current path is emitted as a leaf to break cycles.
+        """
+        nodes = self.nodes
+        
+        def make(index: int) -> DependencyTree:
+            node = nodes[index]
+            # Trusted internal data: skip per-node validation
+            return DependencyTree.model_construct(
+                name=node.name, version=node.version, dependencies=[]
+            )
+        
+        trees = []
+        # Ancestors of the node being expanded; added and removed as the
+        # walk descends and backtracks, so no per-branch copies are made
+        path: Set[int] = set()
+        for root in self.roots:
+            root_tree = make(root)
+            trees.append(root_tree)
+            if max_depth <= 0:
+                continue
+            
+            path.add(root)
+            stack = [(root, root_tree, iter(nodes[root].dep_indices), 0)]
+            while stack:
+                index, tree, children, depth = stack[-1]
+                child = next(children, None)
+                if child is None:
+                    stack.pop()
+                    path.discard(index)
+                    continue
+                
+                child_tree = make(child)
+                tree.dependencies.append(child_tree)
+                if depth + 1 < max_depth and child not in path:
+                    path.add(child)
+                    stack.append((child, child_tree, iter(nodes[child].dep_indices), depth + 1))
+        
+        return trees
+
 class ResolvedPackage(BaseModel):
     """Information about a resolved package"""
     version: str
@@ -3,12 +3,14 @@
 Prisma cleanup script to ensure the query engine binary is available at runtime.
 """
 import subprocess
-import sys
-import os
 
 def main():
     """Ensure Prisma is properly set up before starting the app."""
     try:
+        # Run one after the other: on a cold container both commands bootstrap
+        # the Prisma CLI and engines into the same cache directory, and
+        # concurrent downloads there can race
+        
         # Fetch the Prisma query engine binary
         print("Fetching Prisma query engine binary...")
         result = subprocess.run(
@@ -13,9 +13,12 @@ sys.path.insert(0, current_dir)
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
-        "main:app",
+        "main:app_factory",
+        factory=True,
         host="0.0.0.0",
         port=8000,
         reload=True,
+        loop="uvloop",
+        http="httptools",
         log_level="info"
     )
@@ -3,20 +3,136 @@ Cache service using Prisma ORM for database operations
 """
 
 import asyncio
-from datetime import datetime, timedelta
+import hashlib
+from itertools import islice
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Optional, Any
 import logging
-import json
+import orjson
 import sys
+import time
 import os
-import pytz
+import re
+import zstandard
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
-from generated import Prisma
+from generated import Prisma, Base64
 from generated.models import Package, Version, Dependency, IndexCache, SearchCache
 
 logger = logging.getLogger(__name__)
 
+UTC = timezone.utc
+
+# "name[extras] (op version, ...)" -> name with extras, version spec
+_REQUIREMENT_RE = re.compile(
+    r'^([A-Za-z0-9_.\-]+(?:\s*\[[^\]]*\])?)\s*\(?\s*((?:>=|<=|==|!=|~=|>|<).*?)?\s*\)?$'
+)
+
+# Cache-friendly SQLite settings: WAL lets readers run alongside the writer
+# and synchronous=NORMAL avoids an fsync per commit. Only journal_mode is
+# stored in the database file; the rest are per connection (see
+# CacheService._configure_sqlite). The busy timeout is set for every
+# connection through socket_timeout in the datasource URL instead.
+_SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",
+    "PRAGMA mmap_size=268435456",
+)
+
+# An "extra == ..." clause in the environment markers
+_EXTRA_MARKER_RE = re.compile(r';.*\bextra\s*==', re.IGNORECASE)
+
+# Shared includes for package lookups; Prisma only batches find_unique calls
+# issued together when their include shapes match
+PACKAGE_INCLUDE = {
+    "versions": {
+        "order_by": {"releaseDate": "desc"}
+    },
+    "dependencies": True
+}
+PACKAGE_METADATA_INCLUDE = {
+    "dependencies": True
+}
+
+# Package columns copied as is from the PyPI "info" object
+_PACKAGE_FIELDS = (
+    ("summary", "summary"),
+    ("description", "description"),
+    ("author", "author"),
+    ("authorEmail", "author_email"),
+    ("maintainer", "maintainer"),
+    ("maintainerEmail", "maintainer_email"),
+    ("license", "license"),
+    ("homepage", "home_page"),
+    ("requiresPython", "requires_python"),
+)
+
+# Version columns loaded when the release file lists are not needed
+_VERSION_METADATA_COLUMNS = "id, packageId, version, releaseDate, yanked, sha256Hash, lastUpdated, createdAt"
+
+def _now_ms() -> int:
+    """Current Unix time in milliseconds, as stored in the cache timestamp columns"""
+    return time.time_ns() // 1_000_000
+
+def _dumps(value: Any) -> str:
+    """Serialize a cache payload for the JSON string columns"""
+    return orjson.dumps(value).decode()
+
+def _parse_upload_time(upload_time: Any, fromiso=datetime.fromisoformat) -> Optional[datetime]:
+    """Parse a release file's upload time as an aware UTC datetime"""
+    try:
+        # Python 3.11's fromisoformat accepts a trailing "Z" as is
+        release_date = fromiso(upload_time)
+    except (TypeError, ValueError):
+        return None
+    
+    # Naive times from PyPI are UTC; normalize any other offset to UTC
+    if release_date.tzinfo is None:
+        return release_date.replace(tzinfo=UTC)
+    return release_date.astimezone(UTC)
+
+def _preferred_sha256(files: List[Dict]) -> Optional[str]:
+    """Pick a release's primary SHA256 hash, preferring wheels over source distributions"""
+    fallback = None
+    for file_info in files:
+        sha256 = (file_info.get('digests') or {}).get('sha256')
+        if not sha256:
+            continue
+        if file_info.get('packagetype') == 'bdist_wheel':
+            return sha256
+        if fallback is None:
+            fallback = sha256
+    return fallback
+
+def _encode_version(package_id: str, version: str, files: List[Dict]) -> Dict[str, Any]:
+    """Build the version row for a release, encoding its file list once"""
+    # Get release date from first file
+    upload_time = files[0].get('upload_time')
+    version_row = {
+        "packageId": package_id,
+        "version": version,
+        "releaseDate": _parse_upload_time(upload_time) if upload_time else None,
+        "files": _dumps(files)
+    }
+    
+    # Store the hash up front so hash lookups never need the file list
+    sha256 = _preferred_sha256(files)
+    if sha256:
+        version_row["sha256Hash"] = sha256
+    return version_row
+
+def _resolution_cache_key(packages: List[str], index_url: Optional[str], python_version: Optional[str], top_n: Optional[int] = None) -> str:
+    """Build a fixed-size SearchCache key for a dependency resolution"""
+    # NUL separators keep distinct package lists from hashing alike; the
+    # index URL and Python version are optional in the request
+    key_parts = sorted(packages) + [index_url or '', python_version or '']
+    if top_n is not None:
+        key_parts.append(str(top_n))
+    key_material = "\0".join(key_parts).encode()
+    return "resolution:" + hashlib.blake2b(key_material, digest_size=16).hexdigest()
+
 class CacheService:
     """Service for managing cached package data using SQLite database"""
     
@@ -29,6 +145,18 @@ class CacheService:
         self.search_cache_ttl = timedelta(hours=1)   # 1 hour for search results
         self.index_cache_ttl = timedelta(hours=12)   # 12 hours for index lists
         
+        # The same TTLs in milliseconds, for comparing with the timestamp columns
+        self.package_cache_ttl_ms = int(self.package_cache_ttl.total_seconds() * 1000)
+        self.search_cache_ttl_ms = int(self.search_cache_ttl.total_seconds() * 1000)
+        self.index_cache_ttl_ms = int(self.index_cache_ttl.total_seconds() * 1000)
+        
+        # Compression for the SearchCache/IndexCache payload columns
+        self._compressor = zstandard.ZstdCompressor(level=3)
+        self._decompressor = zstandard.ZstdDecompressor()
+        
+        # Set once the FTS5 search index has been created
+        self.search_index_enabled = False
+        
     async def initialize(self):
         """Initialize database connection and run migrations"""
         try:
@@ -36,6 +164,9 @@ class CacheService:
             self.is_connected = True
             logger.info("Database connected successfully")
             
+            await self._configure_sqlite()
+            await self._ensure_search_index()
+            
             # Optionally run migrations here if needed
             # In production, you'd run migrations separately
             
@@ -43,8 +174,48 @@ class CacheService:
             logger.error(f"Failed to initialize database: {e}")
             raise
     
+    async def _configure_sqlite(self):
+        """
+        Apply SQLite PRAGMAs for the cache workload
+        
+        Only journal_mode is reliably applied: it persists in the database
+        file. The other PRAGMAs are per connection, and the query engine runs
+        each one on whichever pooled connection is free, so they are a
+        best-effort tuning of that connection only; the pool is not pinned
+        to one connection, which would serialize every query. Settings that
+        every connection needs go in the datasource URL (the busy timeout is
+        socket_timeout in schema.prisma). Failures are logged and the
+        defaults kept.
+        """
+        for pragma in _SQLITE_PRAGMAS:
+            try:
+                # query_raw, since several PRAGMAs return a row
+                await self.db.query_raw(pragma)
+            except Exception as e:
+                logger.warning(f"Failed to apply '{pragma}': {e}")
+    
+    async def _ensure_search_index(self):
+        """
+        Create the FTS5 table backing partial search matching
+        
+        Prisma cannot model virtual tables, so it is created with raw SQL.
+        The trigram tokenizer lets SQLite answer substring MATCH queries of
+        three or more characters from the index. Without FTS5 support we fall
+        back to scanning in Python.
+        """
+        try:
+            await self.db.execute_raw(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+                "query UNINDEXED, name, summary, result_json UNINDEXED, "
+                "last_updated UNINDEXED, tokenize='trigram')"
+            )
+            self.search_index_enabled = True
+        except Exception as e:
+            logger.warning(f"FTS5 search index unavailable, using table scan: {e}")
+            self.search_index_enabled = False
+    
     async def close(self):
-        """Close database connection"""
+        """Close database connection (SQLite checkpoints the WAL on the last close)"""
         if self.is_connected:
             await self.db.disconnect()
             self.is_connected = False
@@ -63,9 +234,11 @@ class CacheService:
     async def get_cache_stats(self) -> Dict[str, Any]:
         """Get basic cache statistics"""
         try:
-            package_count = await self.db.package.count()
-            version_count = await self.db.version.count()
-            search_cache_count = await self.db.searchcache.count()
+            package_count, version_count, search_cache_count = await asyncio.gather(
+                self.db.package.count(),
+                self.db.version.count(),
+                self.db.searchcache.count()
+            )
             
             return {
                 "packages": package_count,
@@ -80,14 +253,15 @@ class CacheService:
     async def get_detailed_stats(self) -> Dict[str, Any]:
         """Get detailed cache statistics"""
         try:
-            stats = await self.get_cache_stats()
-            
-            # Get oldest and newest entries
-            oldest_package = await self.db.package.find_first(
-                order={"createdAt": "asc"}
-            )
-            newest_package = await self.db.package.find_first(
-                order={"createdAt": "desc"}
+            # Get counts plus oldest and newest entries concurrently
+            stats, oldest_package, newest_package = await asyncio.gather(
+                self.get_cache_stats(),
+                self.db.package.find_first(
+                    order={"createdAt": "asc"}
+                ),
+                self.db.package.find_first(
+                    order={"createdAt": "desc"}
+                )
             )
             
             # Calculate cache hit rate (simplified)
@@ -105,21 +279,18 @@ class CacheService:
             logger.error(f"Failed to get detailed stats: {e}")
             return {"error": str(e)}
     
-    async def get_package(self, package_name: str) -> Optional[Package]:
-        """Get cached package information"""
+    async def get_package(self, package_name: str, with_files: bool = False) -> Optional[Package]:
+        """Get cached package information (version file lists only if with_files)"""
         try:
             package = await self.db.package.find_unique(
                 where={"name": package_name},
-                include={
-                    "versions": {
-                        "order_by": {"releaseDate": "desc"}
-                    },
-                    "dependencies": True
-                }
+                include=PACKAGE_INCLUDE if with_files else PACKAGE_METADATA_INCLUDE
             )
             
             # Check if cache is still valid
-            if package and self._is_cache_fresh(package.lastUpdated, self.package_cache_ttl):
+            if package and self._is_cache_fresh(package.lastUpdated, self.package_cache_ttl_ms):
+                if not with_files:
+                    await self._load_version_metadata([package])
                 return package
             
             return None
@@ -128,6 +299,52 @@ class CacheService:
             logger.error(f"Failed to get cached package {package_name}: {e}")
             return None
     
+    async def get_packages(self, package_names: List[str], with_files: bool = False) -> List[Optional[Package]]:
+        """Get cached packages for several names, in the same order"""
+        try:
+            # One query for all the names, then put the rows back in request order
+            rows = await self.db.package.find_many(
+                where={"name": {"in": list(set(package_names))}},
+                include=PACKAGE_INCLUDE if with_files else PACKAGE_METADATA_INCLUDE
+            )
+            packages_by_name = {package.name: package for package in rows}
+            
+            fresh_packages = [
+                package if package and self._is_cache_fresh(package.lastUpdated, self.package_cache_ttl_ms) else None
+                for package in map(packages_by_name.get, package_names)
+            ]
+            if not with_files:
+                await self._load_version_metadata([package for package in fresh_packages if package])
+            return fresh_packages
+            
+        except Exception as e:
+            logger.error(f"Failed to get cached packages: {e}")
+            return [None] * len(package_names)
+    
+    async def _load_version_metadata(self, packages: List[Package]):
+        """
+        Attach versions to packages without their release file lists
+        
+        Prisma includes cannot select columns, so the version rows are read
+        with raw SQL, newest first, in one query for all the packages.
+        """
+        if not packages:
+            return
+        
+        placeholders = ", ".join("?" * len(packages))
+        versions = await self.db.query_raw(
+            f"SELECT {_VERSION_METADATA_COLUMNS} FROM versions "
+            f"WHERE packageId IN ({placeholders}) ORDER BY releaseDate DESC",
+            *[package.id for package in packages],
+            model=Version
+        )
+        
+        versions_by_package: Dict[str, List[Version]] = {package.id: [] for package in packages}
+        for version in versions:
+            versions_by_package[version.packageId].append(version)
+        for package in packages:
+            package.versions = versions_by_package[package.id]
+    
     async def cache_package(self, package_data: Dict[str, Any]) -> Optional[Package]:
         """Cache package information"""
         try:
@@ -135,22 +352,17 @@ class CacheService:
             info = package_data['info']
             
             # Prepare package data
-            package_input = {
-                "id": package_name,
-                "name": package_name,
-                "summary": info.get('summary'),
-                "description": info.get('description'),
-                "author": info.get('author'),
-                "authorEmail": info.get('author_email'),
-                "maintainer": info.get('maintainer'),
-                "maintainerEmail": info.get('maintainer_email'),
-                "license": info.get('license'),
-                "homepage": info.get('home_page'),
-                "projectUrls": json.dumps(info.get('project_urls', {})),
-                "keywords": ','.join(info.get('keywords', [])) if info.get('keywords') else None,
-                "classifiers": json.dumps(info.get('classifiers', [])),
-                "requiresPython": info.get('requires_python'),
-            }
+            package_input = {field: info.get(key) for field, key in _PACKAGE_FIELDS}
+            keywords = info.get('keywords')
+            package_input.update(
+                id=package_name,
+                name=package_name,
+                projectUrls=_dumps(info.get('project_urls', {})),
+                # PyPI sends keywords as one string; older metadata may have a list
+                keywords=(keywords if isinstance(keywords, str) else ','.join(keywords)) if keywords else None,
+                classifiers=_dumps(info.get('classifiers', [])),
+                lastUpdated=_now_ms()
+            )
             
             # Upsert package
             package = await self.db.package.upsert(
@@ -178,44 +390,31 @@ class CacheService:
     async def _cache_versions(self, package_id: str, releases: Dict[str, List[Dict]]):
         """Cache version information for a package"""
         try:
-            for version_string, files in releases.items():
-                if not files:  # Skip empty releases
-                    continue
-                
-                # Get release date from first file
-                release_date = None
-                if files and 'upload_time' in files[0]:
-                    try:
-                        upload_time_str = files[0]['upload_time']
-                        if upload_time_str.endswith('Z'):
-                            upload_time_str = upload_time_str.replace('Z', '+00:00')
-                        release_date = datetime.fromisoformat(upload_time_str)
-                        
-                        # Ensure timezone-aware
-                        if release_date.tzinfo is None:
-                            release_date = pytz.UTC.localize(release_date)
-                    except Exception:
-                        pass
-                
-                version_input = {
-                    "packageId": package_id,
-                    "version": version_string,
-                    "releaseDate": release_date,
-                    "files": json.dumps(files)
-                }
-                
-                await self.db.version.upsert(
-                    where={
-                        "packageId_version": {
-                            "packageId": package_id,
-                            "version": version_string
+            version_rows = [
+                _encode_version(package_id, version_string, files)
+                for version_string, files in releases.items()
+                if files  # Skip empty releases
+            ]
+            
+            if not version_rows:
+                return
+            
+            # Send every upsert to the query engine in one batched transaction.
+            # Upserts (rather than delete + create) keep cached sha256 hashes.
+            async with self.db.batch_() as batcher:
+                for version_input in version_rows:
+                    batcher.version.upsert(
+                        where={
+                            "packageId_version": {
+                                "packageId": package_id,
+                                "version": version_input["version"]
+                            }
+                        },
+                        data={
+                            "create": version_input,
+                            "update": version_input
                         }
-                    },
-                    data={
-                        "create": version_input,
-                        "update": version_input
-                    }
-                )
+                    )
                 
         except Exception as e:
             logger.error(f"Failed to cache versions for {package_id}: {e}")
@@ -223,17 +422,9 @@ class CacheService:
     async def _cache_dependencies(self, package_id: str, requires_dist: Optional[List[str]]):
         """Cache dependency information for a package"""
         try:
-            # Clear existing dependencies
-            await self.db.dependency.delete_many(
-                where={"packageId": package_id}
-            )
-            
-            # Check if requires_dist is None or empty
-            if not requires_dist:
-                return
-            
-            # Add new dependencies
-            for req in requires_dist:
+            # Desired rows keyed by (name, version spec, optional), in input order
+            wanted: Dict[tuple, None] = {}
+            for req in requires_dist or []:  # requires_dist may be None or empty
                 if not req:
                     continue
                 
@@ -241,12 +432,33 @@ class CacheService:
                 dep_name, version_spec = self._parse_requirement_string(req)
                 
                 if dep_name:
-                    await self.db.dependency.create(
+                    wanted[(dep_name, version_spec, _EXTRA_MARKER_RE.search(req) is not None)] = None
+            
+            # Diff against the cached rows so an unchanged list causes no writes
+            stale_ids = []
+            for dependency in await self.db.dependency.find_many(where={"packageId": package_id}):
+                key = (dependency.dependencyName, dependency.versionSpec, dependency.optional)
+                if key in wanted:
+                    del wanted[key]
+                else:
+                    stale_ids.append(dependency.id)
+            
+            if not stale_ids and not wanted:
+                return
+            
+            async with self.db.batch_() as batcher:
+                if stale_ids:
+                    batcher.dependency.delete_many(
+                        where={"id": {"in": stale_ids}}
+                    )
+                
+                for dep_name, version_spec, optional in wanted:
+                    batcher.dependency.create(
                         data={
                             "packageId": package_id,
                             "dependencyName": dep_name,
                             "versionSpec": version_spec,
-                            "optional": 'extra' in req.lower()  # Simplified detection
+                            "optional": optional
                         }
                     )
                     
@@ -255,24 +467,14 @@ class CacheService:
     
     def _parse_requirement_string(self, requirement: str) -> tuple[str, Optional[str]]:
         """Parse a requirement string to extract name and version spec"""
-        try:
-            # Split on semicolon to remove environment markers
-            main_req = requirement.split(';')[0].strip()
-            
-            # Find version operators
-            for op in ['>=', '<=', '==', '!=', '>', '<', '~=']:
-                if op in main_req:
-                    parts = main_req.split(op, 1)
-                    if len(parts) == 2:
-                        name = parts[0].strip()
-                        version = f"{op}{parts[1].strip()}"
-                        return name, version
-            
-            # No version specification
-            return main_req.strip(), None
-            
-        except Exception:
-            return requirement.strip(), None
+        # Split on semicolon to remove environment markers
+        main_req = requirement.split(';', 1)[0].strip()
+        match = _REQUIREMENT_RE.match(main_req)
+        if match:
+            return match.group(1), match.group(2) or None
+        
+        # Unrecognized format: keep the whole string as the name
+        return main_req, None
     
     async def get_search_cache(self, query: str) -> Optional[List[Dict[str, Any]]]:
         """Get cached search results"""
@@ -281,8 +483,8 @@ class CacheService:
                 where={"query": query}
             )
             
-            if cache_entry and self._is_cache_fresh(cache_entry.lastUpdated, self.search_cache_ttl):
-                return json.loads(cache_entry.results)
+            if cache_entry and self._is_cache_fresh(cache_entry.lastUpdated, self.search_cache_ttl_ms):
+                return self._unpack(cache_entry.results)
             
             return None
             
@@ -293,74 +495,126 @@ class CacheService:
     async def cache_search_results(self, query: str, results: List[Dict[str, Any]]):
         """Cache search results"""
         try:
+            results_blob = self._pack(results)
+            now_ms = _now_ms()
             await self.db.searchcache.upsert(
                 where={"query": query},
                 data={
                     "create": {
                         "query": query,
-                        "results": json.dumps(results)
+                        "results": results_blob,
+                        "lastUpdated": now_ms
                     },
                     "update": {
-                        "results": json.dumps(results)
+                        "results": results_blob,
+                        "lastUpdated": now_ms
                     }
                 }
             )
             
+            if self.search_index_enabled:
+                await self._index_search_results(query, results, now_ms)
+            
         except Exception as e:
             logger.error(f"Failed to cache search results for '{query}': {e}")
     
+    async def _index_search_results(self, query: str, results: List[Dict[str, Any]], now_ms: int):
+        """Replace the search index rows for a cached query"""
+        async with self.db.batch_() as batcher:
+            batcher.execute_raw("DELETE FROM search_index WHERE query = ?", query)
+            for result in results:
+                if not isinstance(result, dict) or not result.get('name'):
+                    continue
+                batcher.execute_raw(
+                    "INSERT INTO search_index (query, name, summary, result_json, last_updated) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    query,
+                    result['name'],
+                    result.get('summary'),
+                    _dumps(result),
+                    now_ms
+                )
+    
     async def get_partial_search_matches(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
         """Get cached search results that contain packages matching the query substring"""
+        if not self.search_index_enabled:
+            return await self._scan_partial_search_matches(query, limit)
+        
+        try:
+            query_lower = query.lower()
+            cutoff = _now_ms() - self.search_cache_ttl_ms
+            
+            if len(query_lower) >= 3:
+                # Trigram index lookup; the query is a quoted phrase so FTS5
+                # syntax characters in it are matched literally
+                condition = "search_index MATCH ?"
+                match_args = ['"' + query_lower.replace('"', '""') + '"']
+            else:
+                # Too short for a trigram, so this scans the table either way
+                condition = "(name LIKE ? OR summary LIKE ?)"
+                match_args = [f"%{query_lower}%", f"%{query_lower}%"]
+            
+            # Exact name matches first, then prefix matches, then substring matches
+            rows = await self.db.query_raw(
+                "SELECT result_json FROM search_index "
+                f"WHERE {condition} AND last_updated > ? "
+                "ORDER BY CASE WHEN lower(name) = ? THEN 0 "
+                "WHEN substr(lower(name), 1, length(?)) = ? THEN 1 ELSE 2 END "
+                "LIMIT ?",
+                *match_args,
+                cutoff,
+                query_lower,
+                query_lower,
+                query_lower,
+                limit
+            )
+            return [orjson.loads(row['result_json']) for row in rows]
+            
+        except Exception as e:
+            logger.error(f"Failed to get partial search matches for '{query}': {e}")
+            return []
+    
+    async def _scan_partial_search_matches(self, query: str, limit: int) -> List[Dict[str, Any]]:
+        """Find partial search matches by scanning every cached search entry"""
         try:
-            # Query all cached search results
-            cache_entries = await self.db.searchcache.find_many()
+            # Query fresh cached search results (served by the lastUpdated index),
+            # skipping dependency resolution entries as they have a different structure
+            cache_entries = await self.db.searchcache.find_many(
+                where={
+                    "lastUpdated": {"gte": _now_ms() - self.search_cache_ttl_ms},
+                    "NOT": {"query": {"startswith": "resolution:"}}
+                }
+            )
             
-            matching_results = []
             query_lower = query.lower()
             
-            for cache_entry in cache_entries:
-                # Skip expired entries
-                if not self._is_cache_fresh(cache_entry.lastUpdated, self.search_cache_ttl):
-                    continue
-                
-                # Skip dependency resolution cache entries (they have different structure)
-                if cache_entry.query.startswith("resolution:"):
-                    continue
-                
-                try:
-                    cached_results = json.loads(cache_entry.results)
+            def iter_matches():
+                """Yield cached results whose name or summary contains the query"""
+                for cache_entry in cache_entries:
+                    try:
+                        cached_results = self._unpack(cache_entry.results)
+                    except Exception as e:
+                        logger.warning(f"Failed to parse cached search entry for {cache_entry.query}: {e}")
+                        continue
                     
                     # Ensure cached_results is a list of dictionaries
                     if not isinstance(cached_results, list):
                         continue
                     
-                    # Find packages that match the query substring
                     for result in cached_results:
                         if not isinstance(result, dict):
                             continue  # Skip non-dict items
-                            
-                        package_name = result.get('name', '').lower()
-                        package_summary = result.get('summary', '').lower()
                         
-                        # Check if query matches package name or summary
-                        if (query_lower in package_name or 
-                            (package_summary and query_lower in package_summary)):
-                            matching_results.append(result)
-                            
-                            # Stop if we have enough results
-                            if len(matching_results) >= limit:
-                                break
-                    
-                    if len(matching_results) >= limit:
-                        break
+                        package_name = (result.get('name') or '').lower()
+                        package_summary = (result.get('summary') or '').lower()
                         
-                except Exception as e:
-                    logger.warning(f"Failed to parse cached search entry for {cache_entry.query}: {e}")
-                    continue
+                        # Check if query matches package name or summary
+                        if query_lower in package_name or query_lower in package_summary:
+                            yield result
             
             # Sort by relevance (exact name matches first, then partial matches)
             def sort_key(result):
-                name = result.get('name', '').lower()
+                name = (result.get('name') or '').lower()
                 if name == query_lower:
                     return 0  # Exact match
                 elif name.startswith(query_lower):
@@ -368,27 +622,25 @@ class CacheService:
                 else:
                     return 2  # Contains query
             
-            matching_results.sort(key=sort_key)
-            return matching_results[:limit]
+            # Stop decoding entries once enough matches have been found
+            return sorted(islice(iter_matches(), limit), key=sort_key)
             
         except Exception as e:
             logger.error(f"Failed to get partial search matches for '{query}': {e}")
             return []
     
-    async def get_dependency_resolution_cache(self, packages: List[str], index_url: str, python_version: str) -> Optional[Dict[str, Any]]:
+    async def get_dependency_resolution_cache(self, packages: List[str], index_url: str, python_version: Optional[str], top_n: Optional[int] = None) -> Optional[Dict[str, Any]]:
         """Get cached dependency resolution results"""
         try:
-            # Create a consistent cache key from sorted packages
-            sorted_packages = sorted(packages)
-            cache_key = f"resolution:{':'.join(sorted_packages)}:{index_url}:{python_version}"
+            cache_key = _resolution_cache_key(packages, index_url, python_version, top_n)
             
             cache_entry = await self.db.searchcache.find_unique(
                 where={"query": cache_key}
             )
             
-            if cache_entry and self._is_cache_fresh(cache_entry.lastUpdated, self.search_cache_ttl):
+            if cache_entry and self._is_cache_fresh(cache_entry.lastUpdated, self.search_cache_ttl_ms):
                 logger.info(f"Using cached dependency resolution for {len(packages)} packages")
-                return json.loads(cache_entry.results)
+                return self._unpack(cache_entry.results)
             
             return None
             
@@ -396,22 +648,24 @@ class CacheService:
             logger.error(f"Failed to get dependency resolution cache: {e}")
             return None
     
-    async def cache_dependency_resolution(self, packages: List[str], index_url: str, python_version: str, resolution: Dict[str, Any]):
+    async def cache_dependency_resolution(self, packages: List[str], index_url: str, python_version: Optional[str], resolution: Dict[str, Any], top_n: Optional[int] = None):
         """Cache dependency resolution results"""
         try:
-            # Create a consistent cache key from sorted packages
-            sorted_packages = sorted(packages)
-            cache_key = f"resolution:{':'.join(sorted_packages)}:{index_url}:{python_version}"
+            cache_key = _resolution_cache_key(packages, index_url, python_version, top_n)
+            resolution_blob = self._pack(resolution)
+            now_ms = _now_ms()
             
             await self.db.searchcache.upsert(
                 where={"query": cache_key},
                 data={
                     "create": {
                         "query": cache_key,
-                        "results": json.dumps(resolution)
+                        "results": resolution_blob,
+                        "lastUpdated": now_ms
                     },
                     "update": {
-                        "results": json.dumps(resolution)
+                        "results": resolution_blob,
+                        "lastUpdated": now_ms
                     }
                 }
             )
@@ -424,38 +678,50 @@ class CacheService:
     async def cache_version_hash(self, package_name: str, version: str, sha256_hash: str):
         """Cache hash information for a specific package version"""
         try:
-            # Check if package exists in cache
-            package = await self.db.package.find_unique(
-                where={"name": package_name}
+            # Package ids are the package names, so the version row can be
+            # updated directly; it already exists for any cached package
+            version_row = await self.db.version.update(
+                where={
+                    "packageId_version": {
+                        "packageId": package_name,
+                        "version": version
+                    }
+                },
+                data={
+                    "sha256Hash": sha256_hash
+                }
             )
             
-            if package:
-                # Update or create the version with hash
-                await self.db.version.upsert(
-                    where={
-                        "packageId_version": {
-                            "packageId": package.id,
-                            "version": version
-                        }
-                    },
-                    data={
-                        "create": {
-                            "packageId": package.id,
-                            "version": version,
-                            "sha256Hash": sha256_hash
-                        },
-                        "update": {
-                            "sha256Hash": sha256_hash
-                        }
-                    }
-                )
+            if version_row:
                 logger.info(f"Cached hash for {package_name}=={version}")
             else:
-                logger.warning(f"Package {package_name} not found in cache, cannot cache hash")
+                logger.warning(f"Version {package_name}=={version} not found in cache, cannot cache hash")
                 
         except Exception as e:
             logger.error(f"Failed to cache hash for {package_name}=={version}: {e}")
     
+    async def cache_version_hashes(self, version_hashes: Dict[tuple, str]):
+        """Cache hashes for several (package name, version) pairs in one batch"""
+        try:
+            # update_many rather than update, so versions that are not cached
+            # are skipped instead of failing the whole batch
+            async with self.db.batch_() as batcher:
+                for (package_name, version), sha256_hash in version_hashes.items():
+                    batcher.version.update_many(
+                        where={
+                            "packageId": package_name,
+                            "version": version
+                        },
+                        data={
+                            "sha256Hash": sha256_hash
+                        }
+                    )
+            
+            logger.info(f"Cached {len(version_hashes)} version hashes")
+            
+        except Exception as e:
+            logger.error(f"Failed to cache version hashes: {e}")
+    
     async def get_index_cache(self, index_url: str) -> Optional[List[str]]:
         """Get cached package list for an index"""
         try:
@@ -463,8 +729,8 @@ class CacheService:
                 where={"indexUrl": index_url}
             )
             
-            if cache_entry and self._is_cache_fresh(cache_entry.lastFetched, self.index_cache_ttl):
-                return json.loads(cache_entry.packageList)
+            if cache_entry and self._is_cache_fresh(cache_entry.lastFetched, self.index_cache_ttl_ms):
+                return self._unpack(cache_entry.packageList)
             
             return None
             
@@ -475,18 +741,19 @@ class CacheService:
     async def cache_index_packages(self, index_url: str, package_list: List[str]):
         """Cache package list for an index"""
         try:
-            now_utc = datetime.now(pytz.UTC)
+            now_ms = _now_ms()
+            package_list_blob = self._pack(package_list)
             await self.db.indexcache.upsert(
                 where={"indexUrl": index_url},
                 data={
                     "create": {
                         "indexUrl": index_url,
-                        "packageList": json.dumps(package_list),
-                        "lastFetched": now_utc
+                        "packageList": package_list_blob,
+                        "lastFetched": now_ms
                     },
                     "update": {
-                        "packageList": json.dumps(package_list),
-                        "lastFetched": now_utc
+                        "packageList": package_list_blob,
+                        "lastFetched": now_ms
                     }
                 }
             )
@@ -508,12 +775,17 @@ class CacheService:
     async def clear_all_cache(self):
         """Clear all cached data"""
         try:
-            # Clear all tables
-            await self.db.dependency.delete_many()
-            await self.db.version.delete_many()
+            # Clear independent tables concurrently, then packages
+            await asyncio.gather(
+                self.db.dependency.delete_many(),
+                self.db.version.delete_many(),
+                self.db.searchcache.delete_many(),
+                self.db.indexcache.delete_many()
+            )
             await self.db.package.delete_many()
-            await self.db.searchcache.delete_many()
-            await self.db.indexcache.delete_many()
+            
+            if self.search_index_enabled:
+                await self.db.execute_raw("DELETE FROM search_index")
             
             logger.info("Cleared all cache data")
             
@@ -523,41 +795,52 @@ class CacheService:
     async def cleanup_expired_cache(self):
         """Remove expired cache entries"""
         try:
-            now_utc = datetime.now(pytz.UTC)
-            cutoff_time = now_utc - self.package_cache_ttl
-            
-            # Remove expired packages
-            await self.db.package.delete_many(
-                where={"lastUpdated": {"lt": cutoff_time}}
-            )
-            
-            # Remove expired search cache
-            search_cutoff = now_utc - self.search_cache_ttl
-            await self.db.searchcache.delete_many(
-                where={"lastUpdated": {"lt": search_cutoff}}
-            )
-            
-            # Remove expired index cache
-            index_cutoff = now_utc - self.index_cache_ttl
-            await self.db.indexcache.delete_many(
-                where={"lastFetched": {"lt": index_cutoff}}
-            )
+            now_ms = _now_ms()
+            cutoff_time = now_ms - self.package_cache_ttl_ms
+            search_cutoff = now_ms - self.search_cache_ttl_ms
+            index_cutoff = now_ms - self.index_cache_ttl_ms
+            
+            # One batched transaction, so SQLite commits once for all tables
+            async with self.db.batch_() as batcher:
+                # Remove expired packages
+                batcher.package.delete_many(
+                    where={"lastUpdated": {"lt": cutoff_time}}
+                )
+                
+                # Remove expired search cache
+                batcher.searchcache.delete_many(
+                    where={"lastUpdated": {"lt": search_cutoff}}
+                )
+                if self.search_index_enabled:
+                    batcher.execute_raw(
+                        "DELETE FROM search_index WHERE last_updated < ?",
+                        search_cutoff
+                    )
+                
+                # Remove expired index cache
+                batcher.indexcache.delete_many(
+                    where={"lastFetched": {"lt": index_cutoff}}
+                )
             
             logger.info("Cleaned up expired cache entries")
             
         except Exception as e:
             logger.error(f"Failed to cleanup expired cache: {e}")
     
-    def _is_cache_fresh(self, last_updated: datetime, ttl: timedelta) -> bool:
-        """Check if cache entry is still fresh"""
-        if not last_updated:
+    def _pack(self, value: Any) -> Base64:
+        """Encode a cache payload for the compressed Bytes columns"""
+        return Base64.encode(self._compressor.compress(orjson.dumps(value)))
+    
+    def _unpack(self, blob: Base64) -> Any:
+        """Decode a payload written by _pack"""
+        return orjson.loads(self._decompressor.decompress(blob.decode()))
+    
+    def _is_cache_fresh(self, last_updated_ms: Optional[int], ttl_ms: int, now_ms: Optional[int] = None) -> bool:
+        """Check if cache entry is still fresh (pass now_ms to reuse one clock read across a loop)"""
+        if not last_updated_ms:
             return False
         
-        # Ensure both datetimes are timezone-aware (UTC)
-        now_utc = datetime.now(pytz.UTC)
-        
-        # If last_updated is naive, assume it's UTC
-        if last_updated.tzinfo is None:
-            last_updated = pytz.UTC.localize(last_updated)
+        if now_ms is None:
+            now_ms = _now_ms()
         
-        return now_utc - last_updated < ttl
\ No newline at end of file
+        return now_ms - last_updated_ms < ttl_ms
\ No newline at end of file
@@ -3,13 +3,23 @@ Package service combining PyPI client and cache for intelligent package manageme
 """
 
 import asyncio
-from typing import List, Optional, Dict, Any, Set
-from datetime import datetime
+import bisect
+import heapq
+import re
+import sys
+import time
+from typing import List, Optional, Dict, Any, Set, Tuple, Iterable, Awaitable
+from datetime import datetime, timezone
+from functools import lru_cache
+from itertools import islice
+from operator import itemgetter
 import logging
 from packaging.version import parse as parse_version, InvalidVersion
 from packaging.specifiers import SpecifierSet
+from pydantic import TypeAdapter
+from cachetools import LRUCache, TTLCache
 
-from .pypi_client import PyPIClient
+from .pypi_client import PyPIClient, POPULAR_PACKAGES
 from .cache_service import CacheService
 from models.package_models import (
     PackageSearchResult,
@@ -18,12 +28,135 @@ from models.package_models import (
     DependencyInfo,
     FileInfo,
     DependencyResolution,
-    DependencyTree,
-    ResolvedPackage
+    ResolvedPackage,
+    ResolvedNode,
+    ResolutionPayload
 )
 
 logger = logging.getLogger(__name__)
 
+# "name[extras] op version" with the environment markers already stripped;
+# longer operators come first so "===" and ">=" win over "==" and ">"
+_SPEC_RE = re.compile(
+    r'^([A-Za-z0-9._\-]+)\s*(\[[^\]]*\])?\s*(?:(===|==|!=|>=|<=|~=|>|<)\s*(.*))?$'
+)
+
+# Version strings and constraints recur across packages and requests, so
+# memoize parsing; the caches are bounded since both come from user input
+_parse_version = lru_cache(maxsize=8192)(parse_version)
+_specifier_set = lru_cache(maxsize=4096)(SpecifierSet)
+
+def _latest_version(versions: Iterable[Any]) -> Any:
+    """Return the version object with the highest .version (raises InvalidVersion)"""
+    best_version = None
+    best_parsed = None
+    for v in versions:
+        parsed = _parse_version(v.version)
+        if best_parsed is None or parsed > best_parsed:
+            best_version, best_parsed = v, parsed
+    return best_version
+
+# Splits a comma-separated keywords field, trimming around the commas
+_KEYWORDS_SPLIT = re.compile(r'\s*,\s*').split
+
+def _split_keywords(raw_keywords: Optional[str]) -> Optional[List[str]]:
+    """Turn PyPI's keywords field into a list of trimmed keywords"""
+    if not raw_keywords:
+        return None
+    return [keyword for keyword in _KEYWORDS_SPLIT(raw_keywords.strip()) if keyword]
+
+def _raw_info_fields(info: Dict[str, Any]) -> Dict[str, Any]:
+    """Map the metadata fields shared by PackageDetails and VersionInfo from a raw PyPI info dict"""
+    return {
+        'summary': info.get('summary'),
+        'description': info.get('description'),
+        'author': info.get('author'),
+        'author_email': info.get('author_email'),
+        'maintainer': info.get('maintainer'),
+        'maintainer_email': info.get('maintainer_email'),
+        'license': info.get('license'),
+        'homepage': info.get('home_page'),
+        'project_urls': info.get('project_urls', {}),
+        'keywords': _split_keywords(info.get('keywords')),
+        'classifiers': info.get('classifiers', []),
+        'requires_python': info.get('requires_python')
+    }
+
+# Serializes whole search result lists in one pydantic-core pass
+_search_results_adapter = TypeAdapter(List[PackageSearchResult])
+
+def _search_rank(query_lower: str, result: Dict[str, Any]) -> Tuple[bool, bool]:
+    """Sort key putting exact name matches first, then prefix matches"""
+    name = result['name'].lower()
+    return name != query_lower, not name.startswith(query_lower)
+
+def _search_result_fields(raw_result: Dict[str, Any], last_updated: str) -> Dict[str, Any]:
+    """Map a raw index search result onto PackageSearchResult fields"""
+    keywords = raw_result.get('keywords')
+    return {
+        'name': raw_result['name'],
+        'summary': raw_result.get('summary'),
+        'description': raw_result.get('description'),
+        'version': raw_result.get('version', '0.0.0'),
+        'author': raw_result.get('author'),
+        'homepage': raw_result.get('homepage'),
+        'keywords': keywords if isinstance(keywords, list) else None,
+        'last_updated': last_updated
+    }
+
+class _NameIndex:
+    """
+    In-process prefix index of search results, keyed by lowercase package name
+    
+    Names are kept in a sorted list, so a prefix lookup is a bisect plus a
+    walk over the matches. Entries older than the TTL are skipped.
+    """
+    
+    def __init__(self, ttl: float, max_size: int = 10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._keys: List[str] = []
+        self._entries: Dict[str, tuple] = {}  # key -> (monotonic time, result)
+    
+    def add(self, result: Dict[str, Any]):
+        """Add or refresh a JSON-ready PackageSearchResult dict"""
+        name = result.get('name')
+        if not name:
+            return
+        key = name.lower()
+        if key not in self._entries:
+            if len(self._keys) >= self.max_size:
+                self._prune()
+                if len(self._keys) >= self.max_size:
+                    return
+            bisect.insort(self._keys, key)
+        self._entries[key] = (time.monotonic(), result)
+    
+    def _prune(self):
+        """Drop entries older than the TTL"""
+        cutoff = time.monotonic() - self.ttl
+        self._entries = {key: entry for key, entry in self._entries.items() if entry[0] >= cutoff}
+        self._keys = sorted(self._entries)
+    
+    def discard(self, name: str):
+        """Remove a package from the index"""
+        key = name.lower()
+        if self._entries.pop(key, None) is not None:
+            del self._keys[bisect.bisect_left(self._keys, key)]
+    
+    def prefix_matches(self, prefix: str, limit: int) -> List[Dict[str, Any]]:
+        """Return up to limit fresh results whose name starts with prefix (exact match first)"""
+        cutoff = time.monotonic() - self.ttl
+        keys = self._keys
+        matches = []
+        i = bisect.bisect_left(keys, prefix)
+        while i < len(keys) and keys[i].startswith(prefix) and len(matches) < limit:
+            added, result = self._entries[keys[i]]
+            if added >= cutoff:
+                matches.append(result)
+            i += 1
+        return matches
+
 class PackageService:
     """High-level service for package operations with intelligent caching"""
     
@@ -32,38 +165,87 @@ class PackageService:
         self.cache_service = cache_service
         
         # Popular packages to warm cache with
-        self.popular_packages = [
-            'requests', 'numpy', 'pandas', 'django', 'flask', 'fastapi',
-            'pytest', 'setuptools', 'wheel', 'pip', 'black', 'flake8',
-            'mypy', 'click', 'pydantic', 'sqlalchemy', 'alembic', 'jinja2',
-            'matplotlib', 'seaborn', 'scikit-learn', 'tensorflow', 'torch',
-            'opencv-python', 'pillow', 'beautifulsoup4', 'lxml', 'httpx'
-        ]
+        self.popular_packages = POPULAR_PACKAGES
+        
+        # Prefix indexes of packages seen in search results and details, per index URL
+        # (index URLs come from requests, so only the most recent few are kept)
+        self._name_indexes: LRUCache = LRUCache(maxsize=32)
+        
+        # Read-through caches in front of the database and PyPI; entries are
+        # dropped by invalidate() when the package cache is cleared
+        self._details_cache: TTLCache = TTLCache(maxsize=2048, ttl=300)
+        self._hash_cache: TTLCache = TTLCache(maxsize=4096, ttl=3600)
+        
+        # In-flight get_package_details calls, so concurrent duplicates share one fetch
+        self._inflight_details: Dict[tuple, asyncio.Task] = {}
+        
+        # Most recent (lowercase query, results, monotonic time) per (client, index URL),
+        # for incremental search as one user keeps typing
+        self._last_searches: LRUCache = LRUCache(maxsize=1024)
+    
+    async def startup(self):
+        """Open the PyPI client's HTTP connection pool once for the app's lifetime"""
+        await self.pypi_client.__aenter__()
+    
+    async def shutdown(self):
+        """Close the PyPI client's HTTP connection pool"""
+        await self.pypi_client.close()
     
     async def search_packages(
         self, 
         query: str, 
         index_url: Optional[str] = None, 
-        limit: int = 10
-    ) -> List[PackageSearchResult]:
+        limit: int = 10,
+        client_id: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
         """
         Search for packages with intelligent caching
         
-        First checks cache, then falls back to live search if needed
+        First checks cache, then falls back to live search if needed.
+        Results are returned as JSON-ready dicts matching PackageSearchResult.
+        client_id identifies the caller for incremental search; without it
+        every search goes through the caches.
         """
         if not index_url:
             index_url = "https://pypi.org"
         
+        query_lower = query.lower()
+        search_key = (client_id, index_url) if client_id else None
+        
+        # Incremental search: a query extending the same client's previous
+        # one can be answered by filtering its previous results
+        last_search = self._last_searches.get(search_key) if search_key else None
+        if (last_search and query_lower.startswith(last_search[0])
+                and time.monotonic() - last_search[2] < self.cache_service.search_cache_ttl.total_seconds()):
+            narrowed = [r for r in last_search[1] if query_lower in r['name'].lower()]
+            if len(narrowed) >= limit:
+                logger.info(f"Narrowing previous search results for '{query}'")
+                # Rank against the new query (the stable sort keeps the previous
+                # order otherwise)
+                narrowed.sort(key=lambda r: _search_rank(query_lower, r))
+                # Keep the original timestamp so narrowing can't extend its lifetime
+                self._last_searches[search_key] = (query_lower, narrowed, last_search[2])
+                return narrowed[:limit]
+        
+        # Answer prefix queries from packages already seen in this process
+        name_index = self._get_name_index(index_url)
+        indexed_matches = name_index.prefix_matches(query_lower, limit)
+        if len(indexed_matches) >= limit:
+            logger.info(f"Returning indexed prefix matches for '{query}'")
+            self._remember_search(search_key, query_lower, indexed_matches)
+            return indexed_matches
+        
         # Check cache first - exact match
         cache_key = f"{query}:{index_url}:{limit}"
         cached_results = await self.cache_service.get_search_cache(cache_key)
         
         if cached_results:
             logger.info(f"Returning cached search results for '{query}'")
-            return [PackageSearchResult(**result) for result in cached_results]
+            self._record_search(name_index, search_key, query_lower, cached_results)
+            return cached_results
         
         # Check for partial matches in cache (for incremental search)
-        partial_matches = await self.cache_service.get_partial_search_matches(query.lower(), limit)
+        partial_matches = await self.cache_service.get_partial_search_matches(query_lower, limit)
         if partial_matches:
             logger.info(f"Found {len(partial_matches)} partial matches in cache for '{query}'")
             # If we have enough partial matches, return them
@@ -71,86 +253,92 @@ class PackageService:
                 # Still do a live search but with a smaller limit to supplement
                 live_limit = max(1, limit - len(partial_matches))
                 try:
-                    async with self.pypi_client as client:
-                        additional_results = await client.search_packages(query, index_url, live_limit)
+                    additional_results = await self.pypi_client.search_packages(query, index_url, live_limit)
                     
-                    # Combine and deduplicate
-                    all_results = partial_matches[:]
-                    existing_names = {result['name'].lower() for result in partial_matches}
+                    # Combine and deduplicate in one pass, keyed by lowercase name
+                    # (dicts keep first-seen order)
+                    seen = {result['name'].lower(): result for result in partial_matches}
                     
+                    last_updated = datetime.now(timezone.utc).isoformat()
                     for raw_result in additional_results:
-                        if raw_result['name'].lower() not in existing_names:
-                            try:
-                                result = {
-                                    'name': raw_result['name'],
-                                    'summary': raw_result.get('summary'),
-                                    'description': raw_result.get('description'),
-                                    'version': raw_result.get('version', '0.0.0'),
-                                    'author': raw_result.get('author'),
-                                    'homepage': raw_result.get('homepage'),
-                                    'keywords': raw_result.get('keywords', []) if isinstance(raw_result.get('keywords'), list) else None,
-                                    'last_updated': datetime.utcnow().isoformat()
-                                }
-                                all_results.append(result)
-                            except Exception as e:
-                                logger.warning(f"Failed to parse additional result: {e}")
-                                continue
+                        name_key = raw_result['name'].lower()
+                        if name_key not in seen:
+                            seen[name_key] = _search_result_fields(raw_result, last_updated)
+                    all_results = list(seen.values())
                     
-                    # Cache the combined results (ensure serializable)
-                    serializable_combined = []
-                    for result in all_results[:limit]:
-                        if isinstance(result, dict):
-                            # Convert any datetime objects to strings
-                            for key, value in result.items():
-                                if isinstance(value, datetime):
-                                    result[key] = value.isoformat()
-                            serializable_combined.append(result)
+                    # Exact name matches first, then prefix matches; the stable
+                    # sort keeps arrival order otherwise
+                    all_results.sort(key=lambda r: _search_rank(query_lower, r))
+                    
+                    # Cache the combined results (validated and serialized in one pass)
+                    serializable_combined = _search_results_adapter.dump_python(
+                        _search_results_adapter.validate_python(all_results[:limit]),
+                        mode="json"
+                    )
                     
                     await self.cache_service.cache_search_results(cache_key, serializable_combined)
-                    return [PackageSearchResult(**result) for result in all_results[:limit]]
+                    self._record_search(name_index, search_key, query_lower, serializable_combined)
+                    return serializable_combined
                     
                 except Exception as e:
                     logger.warning(f"Failed to get additional results, returning cached partial matches: {e}")
-                    return [PackageSearchResult(**result) for result in partial_matches[:limit]]
+                    return partial_matches[:limit]
         
         # Perform live search
         logger.info(f"Performing live search for '{query}' on {index_url}")
         
-        async with self.pypi_client as client:
-            raw_results = await client.search_packages(query, index_url, limit)
+        raw_results = await self.pypi_client.search_packages(query, index_url, limit)
         
-        # Convert to our model format
+        # Convert to our model format, with one timestamp for the whole search
+        last_updated = datetime.now(timezone.utc).isoformat()
         results = []
         for raw_result in raw_results:
             try:
-                result = PackageSearchResult(
-                    name=raw_result['name'],
-                    summary=raw_result.get('summary'),
-                    description=raw_result.get('description'),
-                    version=raw_result.get('version', '0.0.0'),
-                    author=raw_result.get('author'),
-                    homepage=raw_result.get('homepage'),
-                    keywords=raw_result.get('keywords', []) if isinstance(raw_result.get('keywords'), list) else None,
-                    last_updated=datetime.utcnow().isoformat()  # Convert to string
-                )
-                results.append(result)
+                results.append(PackageSearchResult.model_validate(_search_result_fields(raw_result, last_updated)))
             except Exception as e:
                 logger.warning(f"Failed to parse search result for {raw_result.get('name', 'unknown')}: {e}")
                 continue
         
-        # Cache the results (serialize manually to handle datetime objects)
-        serializable_results = []
-        for result in results:
-            result_dict = result.dict()
-            # Convert any datetime objects to strings
-            for key, value in result_dict.items():
-                if isinstance(value, datetime):
-                    result_dict[key] = value.isoformat()
-            serializable_results.append(result_dict)
+        # Cache the results (serialized in one pass so datetimes become strings)
+        serializable_results = _search_results_adapter.dump_python(results, mode="json")
         
         await self.cache_service.cache_search_results(cache_key, serializable_results)
+        self._record_search(name_index, search_key, query_lower, serializable_results)
         
-        return results
+        return serializable_results
+    
+    def _get_name_index(self, index_url: str) -> _NameIndex:
+        """Get the prefix index for a package index URL"""
+        name_index = self._name_indexes.get(index_url)
+        if name_index is None:
+            name_index = _NameIndex(self.cache_service.search_cache_ttl.total_seconds())
+            self._name_indexes[index_url] = name_index
+        return name_index
+    
+    def _record_search(self, name_index: _NameIndex, search_key: Optional[tuple], query_lower: str, results: List[Dict[str, Any]]):
+        """Add JSON-ready search results to the prefix index and remember them for incremental search"""
+        for result in results:
+            name_index.add(result)
+        self._remember_search(search_key, query_lower, results)
+    
+    def _remember_search(self, search_key: Optional[tuple], query_lower: str, results: List[Dict[str, Any]]):
+        """Remember a client's latest search so an extended query can narrow it"""
+        if search_key:
+            self._last_searches[search_key] = (query_lower, results, time.monotonic())
+    
+    def _index_package_details(self, index_url: str, package_details: PackageDetails):
+        """Add a package's details to the prefix index as a search result"""
+        self._get_name_index(index_url).add(_search_results_adapter.dump_python([
+            PackageSearchResult(
+                name=package_details.name,
+                summary=package_details.summary,
+                version=package_details.latest_version,
+                author=package_details.author,
+                homepage=package_details.homepage,
+                keywords=package_details.keywords,
+                last_updated=package_details.last_updated
+            )
+        ], mode="json")[0])
     
     async def get_package_details(
         self,
@@ -161,24 +349,57 @@ class PackageService:
     ) -> Optional[PackageDetails]:
         """
         Get comprehensive package details with caching
+        
+        Concurrent calls for the same package share one fetch.
         """
         if not index_url:
             index_url = "https://pypi.org"
         
+        key = (package_name, index_url, include_versions, include_dependencies)
+        package_details = self._get_cached_details(key)
+        if package_details is not None:
+            return package_details
+        
+        task = self._inflight_details.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_and_cache_details(key))
+            self._inflight_details[key] = task
+            task.add_done_callback(lambda _: self._inflight_details.pop(key, None))
+        
+        # Shielded so one caller being cancelled, including the one that
+        # started the fetch, doesn't cancel it for the others
+        return await asyncio.shield(task)
+    
+    async def _fetch_and_cache_details(self, key: tuple) -> Optional[PackageDetails]:
+        """Fetch package details for a get_package_details key and cache them"""
+        package_details = await self._fetch_package_details(*key)
+        if package_details is not None:
+            self._details_cache[key] = package_details
+        return package_details
+    
+    async def _fetch_package_details(
+        self,
+        package_name: str,
+        index_url: str,
+        include_versions: bool,
+        include_dependencies: bool
+    ) -> Optional[PackageDetails]:
+        """Get package details from the cache, falling back to the index"""
         # Check cache first
         cached_package = await self.cache_service.get_package(package_name)
         
         if cached_package:
             logger.info(f"Returning cached package details for {package_name}")
-            return await self._convert_cached_to_package_details(
+            package_details = await self._convert_cached_to_package_details(
                 cached_package, include_versions, include_dependencies
             )
+            self._index_package_details(index_url, package_details)
+            return package_details
         
         # Fetch from PyPI
         logger.info(f"Fetching live package details for {package_name} from {index_url}")
         
-        async with self.pypi_client as client:
-            package_data = await client.get_package_info(package_name, index_url)
+        package_data = await self.pypi_client.get_package_info(package_name, index_url)
         
         if not package_data:
             return None
@@ -186,18 +407,50 @@ class PackageService:
         # Cache the package data
         await self.cache_service.cache_package(package_data)
         
-        # Convert to our model
-        return await self._convert_raw_to_package_details(
-            package_data, include_versions, include_dependencies
-        )
+        # Convert to our model with every field, since the index returned them
+        # all anyway; later calls asking for fewer fields are projected from it
+        package_details = await self._convert_raw_to_package_details(package_data, True, True)
+        self._details_cache[(package_name, index_url, True, True)] = package_details
+        self._index_package_details(index_url, package_details)
+        return self._project_details(package_details, include_versions, include_dependencies)
+    
+    def _get_cached_details(self, key: tuple) -> Optional[PackageDetails]:
+        """Find in-process details for a key, projecting from entries with more fields"""
+        package_details = self._details_cache.get(key)
+        if package_details is not None:
+            return package_details
+        
+        package_name, index_url, include_versions, include_dependencies = key
+        for has_versions, has_dependencies in ((True, True), (True, False), (False, True)):
+            if has_versions < include_versions or has_dependencies < include_dependencies:
+                continue
+            richer_details = self._details_cache.get((package_name, index_url, has_versions, has_dependencies))
+            if richer_details is not None:
+                return self._project_details(richer_details, include_versions, include_dependencies)
+        return None
+    
+    def _project_details(
+        self,
+        package_details: PackageDetails,
+        include_versions: bool,
+        include_dependencies: bool
+    ) -> PackageDetails:
+        """Drop the versions or dependencies a caller did not ask for"""
+        update = {}
+        if not include_versions:
+            update['versions'] = None
+        if not include_dependencies:
+            update['dependencies'] = None
+        return package_details.model_copy(update=update) if update else package_details
     
     async def get_package_versions(
         self,
         package_name: str,
         index_url: Optional[str] = None,
-        include_yanked: bool = False
+        include_yanked: bool = False,
+        limit: Optional[int] = None
     ) -> List[VersionInfo]:
-        """Get all versions for a package"""
+        """Get all versions for a package, newest first (only the newest limit if given)"""
         package_details = await self.get_package_details(
             package_name, index_url, include_versions=True
         )
@@ -210,16 +463,20 @@ class PackageService:
         if not include_yanked:
             versions = [v for v in versions if not v.yanked]
         
-        # Sort by version (newest first)
-        try:
-            versions.sort(
-                key=lambda v: parse_version(v.version), 
-                reverse=True
-            )
-        except Exception as e:
-            logger.warning(f"Failed to sort versions for {package_name}: {e}")
+        # Sort by version (newest first), dropping versions that don't parse
+        decorated = []
+        for v in versions:
+            try:
+                decorated.append((_parse_version(v.version), v))
+            except InvalidVersion:
+                logger.debug(f"Skipping invalid version {v.version} of {package_name}")
         
-        return versions
+        if limit is not None:
+            # Partial selection instead of sorting every release
+            return [v for _, v in heapq.nlargest(limit, decorated, key=itemgetter(0))]
+        
+        decorated.sort(key=itemgetter(0), reverse=True)
+        return [v for _, v in decorated]
     
     async def get_version_details(
         self,
@@ -231,10 +488,9 @@ class PackageService:
         if not index_url:
             index_url = "https://pypi.org"
         
-        async with self.pypi_client as client:
-            version_data = await client.get_package_version_info(
-                package_name, version, index_url
-            )
+        version_data = await self.pypi_client.get_package_version_info(
+            package_name, version, index_url
+        )
         
         if not version_data:
             return None
@@ -251,13 +507,114 @@ class PackageService:
         try:
             # First check if we have cached hash information
             cached_package = await self.cache_service.get_package(package_name)
-            if cached_package and cached_package.versions:
-                for cached_version in cached_package.versions:
-                    if cached_version.version == version and cached_version.sha256Hash:
-                        logger.info(f"Using cached hash for {package_name}=={version}")
-                        return cached_version.sha256Hash
+            cached_hash = self._get_cached_hash(cached_package, version)
+            if cached_hash:
+                logger.info(f"Using cached hash for {package_name}=={version}")
+                return cached_hash
             
             # If not cached, fetch from PyPI
+            return await self._fetch_package_hash(package_name, version, index_url)
+        except Exception as e:
+            logger.warning(f"Failed to get hash for {package_name}=={version}: {e}")
+            return None
+    
+    async def get_package_hashes(
+        self,
+        resolved_packages: Dict[str, str],
+        index_url: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> Dict[str, ResolvedPackage]:
+        """
+        Get SHA256 hashes for resolved packages, looking the cache up in one batch
+        
+        With a limit, only the first limit packages (in dict order) are looked
+        up; the rest are returned without a hash.
+        """
+        hash_targets = dict(islice(resolved_packages.items(), limit))
+        cached_packages = await self.cache_service.get_packages(list(hash_targets))
+        
+        # Hashes fetched from the index, written back to the cache together
+        fetched_hashes: Dict[tuple, str] = {}
+        
+        async def load_hash(package_name: str, version: str, cached_package) -> Optional[str]:
+            package_hash = self._get_cached_hash(cached_package, version)
+            if package_hash:
+                return package_hash
+            package_hash = await self._fetch_package_hash(package_name, version, index_url, persist=False)
+            if package_hash:
+                fetched_hashes[(package_name, version)] = package_hash
+            return package_hash
+        
+        hash_results = await self._gather_bounded(
+            load_hash(package_name, version, cached_package)
+            for (package_name, version), cached_package in zip(hash_targets.items(), cached_packages)
+        )
+        
+        if fetched_hashes:
+            await self.cache_service.cache_version_hashes(fetched_hashes)
+        
+        resolved_packages_with_hash = {}
+        for (package_name, version), package_hash in zip(hash_targets.items(), hash_results):
+            try:
+                if isinstance(package_hash, Exception):
+                    raise package_hash
+                resolved_packages_with_hash[package_name] = ResolvedPackage(
+                    version=version,
+                    sha256_hash=package_hash
+                )
+                logger.info(f"Hash for {package_name}=={version}: {'found' if package_hash else 'not found'}")
+            except Exception as e:
+                logger.warning(f"Failed to get hash for {package_name}=={version}: {e}")
+                resolved_packages_with_hash[package_name] = ResolvedPackage(
+                    version=version,
+                    sha256_hash=None
+                )
+        
+        for package_name, version in islice(resolved_packages.items(), len(hash_targets), None):
+            resolved_packages_with_hash[package_name] = ResolvedPackage(
+                version=version,
+                sha256_hash=None
+            )
+        
+        return resolved_packages_with_hash
+    
+    async def _gather_bounded(self, coros: Iterable[Awaitable], max_concurrency: int = 20) -> List[Any]:
+        """
+        Await coroutines concurrently, at most max_concurrency at a time
+        
+        Results come back in order, with exceptions returned in place of
+        results. PyPIClient's rate limiter still paces the outbound requests.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def bounded(coro: Awaitable) -> Any:
+            async with semaphore:
+                return await coro
+        
+        return await asyncio.gather(*(bounded(coro) for coro in coros), return_exceptions=True)
+    
+    def _get_cached_hash(self, cached_package: Optional[Any], version: str) -> Optional[str]:
+        """Find a version's hash in a cached package record"""
+        if cached_package and cached_package.versions:
+            for cached_version in cached_package.versions:
+                if cached_version.version == version and cached_version.sha256Hash:
+                    return cached_version.sha256Hash
+        return None
+    
+    async def _fetch_package_hash(
+        self,
+        package_name: str,
+        version: str,
+        index_url: Optional[str] = None,
+        persist: bool = True
+    ) -> Optional[str]:
+        """Fetch a version's SHA256 hash from the index and cache it (in the database only if persist)"""
+        key = (package_name, version, index_url)
+        found_hash = self._hash_cache.get(key)
+        if found_hash:
+            return found_hash
+        
+        try:
             version_details = await self.get_version_details(package_name, version, index_url)
             if version_details and version_details.files:
                 found_hash = None
@@ -279,6 +636,8 @@ class PackageService:
                 
                 # Cache the hash if we found one
                 if found_hash:
+                    self._hash_cache[key] = found_hash
+                if found_hash and persist:
                     try:
                         await self.cache_service.cache_version_hash(package_name, version, found_hash)
                     except Exception as e:
@@ -295,20 +654,22 @@ class PackageService:
         self,
         packages: List[str],
         index_url: Optional[str] = None,
-        python_version: str = "3.9"
+        python_version: str = "3.9",
+        top_n: Optional[int] = None
     ) -> DependencyResolution:
         """
         Resolve dependencies for a list of packages
         
         For large package lists (like requirements.txt), analyze relationships
-        to identify main packages vs dependencies.
+        to identify main packages vs dependencies. With top_n, hashes are only
+        looked up for that many packages, main packages first.
         """
         if not index_url:
             index_url = "https://pypi.org"
         
         # Check cache first
         cached_resolution = await self.cache_service.get_dependency_resolution_cache(
-            packages, index_url, python_version
+            packages, index_url, python_version, top_n
         )
         
         if cached_resolution:
@@ -324,16 +685,16 @@ class PackageService:
         # For large package lists, use dependency analysis
         if len(packages) > 15:
             logger.info(f"Using dependency analysis for {len(packages)} packages")
-            resolution = await self._analyze_package_relationships(packages, index_url, start_time)
+            resolution = await self._analyze_package_relationships(packages, index_url, start_time, top_n)
         else:
             # For smaller lists, use the original approach
             logger.info(f"Using traditional resolution for {len(packages)} packages")
-            resolution = await self._resolve_packages_traditional(packages, index_url, start_time)
+            resolution = await self._resolve_packages_traditional(packages, index_url, start_time, top_n)
         
         # Cache the resolution
         try:
             await self.cache_service.cache_dependency_resolution(
-                packages, index_url, python_version, resolution.dict()
+                packages, index_url, python_version, resolution.dict(), top_n
             )
         except Exception as e:
             logger.warning(f"Failed to cache dependency resolution: {e}")
@@ -344,7 +705,8 @@ class PackageService:
         self,
         packages: List[str],
         index_url: str,
-        start_time: float
+        start_time: float,
+        top_n: Optional[int] = None
     ) -> DependencyResolution:
         """
         Analyze relationships between packages to identify main vs dependencies
@@ -353,8 +715,9 @@ class PackageService:
         warnings = []
         conflicts = []
         
-        # Step 1: Parse all package names and versions
-        parsed_packages = {}
+        # Step 1: Parse all package names and versions, keyed by lowercase name
+        # so they compare directly with dependency names
+        parsed_packages: Dict[str, tuple] = {}  # key -> (package_name, version)
         for package_spec in packages:
             try:
                 package_name, version_constraint = self._parse_package_spec(package_spec)
@@ -362,45 +725,62 @@ class PackageService:
                     version = version_constraint[2:].strip()
                 else:
                     version = "latest"
-                parsed_packages[package_name] = version
+                parsed_packages[package_name.lower()] = (package_name, version)
                 resolved_packages[package_name] = version
             except Exception as e:
                 logger.warning(f"Failed to parse package spec '{package_spec}': {e}")
                 continue
         
         # Step 2: Get dependency information for all packages
-        package_dependencies = {}
-        for package_name in parsed_packages.keys():
+        package_dependencies: Dict[str, Set[str]] = {}
+        package_names = [package_name for package_name, _ in parsed_packages.values()]
+        
+        # Reuse details already built in this process; only the rest are
+        # looked up in the database, in one batch
+        known_details = {
+            package_name: self._get_cached_details((package_name, index_url, True, True))
+            for package_name in package_names
+        }
+        missing_names = [package_name for package_name, details in known_details.items() if details is None]
+        cached_packages = dict(zip(missing_names, await self.cache_service.get_packages(missing_names)))
+        
+        async def load_details(package_name: str) -> Optional[PackageDetails]:
+            package_details = known_details[package_name]
+            if package_details is not None:
+                return package_details
+            cached_package = cached_packages[package_name]
+            if cached_package:
+                package_details = await self._convert_cached_to_package_details(cached_package, True, True)
+                self._details_cache[(package_name, index_url, True, True)] = package_details
+                return package_details
+            return await self.get_package_details(package_name, index_url, include_dependencies=True)
+        
+        details_results = await self._gather_bounded(
+            load_details(package_name) for package_name in package_names
+        )
+        for key, package_name, package_details in zip(parsed_packages, package_names, details_results):
             try:
-                package_details = await self.get_package_details(package_name, index_url, include_dependencies=True)
+                if isinstance(package_details, Exception):
+                    raise package_details
                 if package_details and package_details.dependencies:
                     # Extract dependency names (ignore version constraints)
-                    deps = set()
-                    for dep in package_details.dependencies:
-                        deps.add(dep.name.lower())
-                    package_dependencies[package_name.lower()] = deps
+                    deps = {dep.name.lower() for dep in package_details.dependencies}
+                    package_dependencies[key] = deps
                     logger.info(f"Found {len(deps)} dependencies for {package_name}: {sorted(deps)}")
                 else:
-                    package_dependencies[package_name.lower()] = set()
+                    package_dependencies[key] = set()
                     logger.info(f"No dependencies found for {package_name}")
             except Exception as e:
                 logger.warning(f"Failed to get dependencies for {package_name}: {e}")
-                package_dependencies[package_name.lower()] = set()
+                package_dependencies[key] = set()
         
         # Step 3: Identify main packages vs dependencies
-        all_package_names = set(p.lower() for p in parsed_packages.keys())
-        dependencies_mentioned = set()
-        
         # Collect all packages that are mentioned as dependencies by other packages in our list
-        for package_name, deps in package_dependencies.items():
-            # Only consider dependencies that are also in our package list
-            dependencies_mentioned.update(dep for dep in deps if dep in all_package_names)
+        package_keys = frozenset(parsed_packages)
+        dependencies_mentioned = set().union(*(deps & package_keys for deps in package_dependencies.values()))
         
         # Main packages are those in our list that are NOT dependencies of other packages in our list
-        main_packages = []
-        for package_name in parsed_packages.keys():
-            if package_name.lower() not in dependencies_mentioned:
-                main_packages.append(package_name)
+        main_packages = [key for key in parsed_packages if key not in dependencies_mentioned]
         
         logger.info(f"Analysis results: {len(parsed_packages)} total packages, {len(dependencies_mentioned)} found as dependencies, {len(main_packages)} identified as main packages")
         logger.info(f"Dependencies found in package list: {sorted(dependencies_mentioned)}")
@@ -408,42 +788,22 @@ class PackageService:
         
         # If we couldn't identify any main packages, fall back to treating first few as main
         if not main_packages:
-            main_packages = list(parsed_packages.keys())[:5]
+            main_packages = list(parsed_packages)[:5]
             warnings.append("Could not determine main packages from dependency analysis")
         
-        # Step 4: Build dependency trees for main packages only
-        dependency_trees = []
-        for main_package in main_packages:
-            try:
-                if main_package.lower() in package_dependencies:
-                    tree = self._build_tree_from_analysis(
-                        main_package, 
-                        parsed_packages[main_package],
-                        package_dependencies,
-                        parsed_packages,
-                        visited=set()
-                    )
-                    if tree:
-                        dependency_trees.append(tree)
-            except Exception as e:
-                logger.warning(f"Failed to build tree for main package {main_package}: {e}")
-        
-        # Step 5: Get hash information for all resolved packages
-        resolved_packages_with_hash = {}
-        for package_name, version in resolved_packages.items():
-            try:
-                package_hash = await self.get_package_hash(package_name, version, index_url)
-                resolved_packages_with_hash[package_name] = ResolvedPackage(
-                    version=version,
-                    sha256_hash=package_hash
-                )
-                logger.info(f"Hash for {package_name}=={version}: {'found' if package_hash else 'not found'}")
-            except Exception as e:
-                logger.warning(f"Failed to get hash for {package_name}=={version}: {e}")
-                resolved_packages_with_hash[package_name] = ResolvedPackage(
-                    version=version,
-                    sha256_hash=None
-                )
+        # Step 4: Build the dependency graph for main packages only
+        graph = self._build_graph_from_analysis(main_packages, package_dependencies, parsed_packages)
+        dependency_trees = graph.to_tree(max_depth=3)
+        
+        # Step 5: Get hash information for the resolved packages, main packages
+        # first so a top_n limit keeps the most relevant ones
+        if top_n is not None:
+            main_names = {parsed_packages[key][0] for key in main_packages}
+            resolved_packages = dict(sorted(
+                resolved_packages.items(),
+                key=lambda item: (item[0] not in main_names, item[0].lower())
+            ))
+        resolved_packages_with_hash = await self.get_package_hashes(resolved_packages, index_url, top_n)
 
         end_time = asyncio.get_event_loop().time()
         
@@ -456,54 +816,75 @@ class PackageService:
             resolution_time=end_time - start_time
         )
     
-    def _build_tree_from_analysis(
+    def _build_graph_from_analysis(
         self,
-        package_name: str,
-        version: str,
+        main_packages: List[str],
         package_dependencies: Dict[str, Set[str]],
-        all_packages: Dict[str, str],
-        visited: Set[str],
-        max_depth: int = 3
-    ) -> Optional[DependencyTree]:
-        """Build dependency tree from pre-analyzed dependency data"""
-        if len(visited) >= max_depth or package_name.lower() in visited:
-            return DependencyTree(name=package_name, version=version)
-        
-        visited.add(package_name.lower())
-        tree = DependencyTree(name=package_name, version=version)
-        
-        # Get dependencies for this package that are also in our package list
-        deps = package_dependencies.get(package_name.lower(), set())
-        
-        for dep_name in deps:
-            if dep_name in all_packages:
-                # This dependency is in our package list
-                subtree = self._build_tree_from_analysis(
-                    dep_name,
-                    all_packages[dep_name],
-                    package_dependencies,
-                    all_packages,
-                    visited.copy(),
-                    max_depth
-                )
-                if subtree:
-                    tree.dependencies.append(subtree)
+        all_packages: Dict[str, tuple]
+    ) -> ResolutionPayload:
+        """
+        Build a flat dependency graph from pre-analyzed dependency data
+        
+        All arguments are keyed by lowercase package name; all_packages maps
+        each key to its (package_name, version).
+        """
+        graph = ResolutionPayload()
+        indices: Dict[str, int] = {}
+        pending: List[str] = []
+        
+        def index_of(key: str) -> int:
+            if key not in indices:
+                indices[key] = len(graph.nodes)
+                package_name, version = all_packages[key]
+                graph.nodes.append(ResolvedNode(name=package_name, version=version))
+                pending.append(key)
+            return indices[key]
         
-        return tree
+        for main_package in main_packages:
+            if main_package in package_dependencies:
+                graph.roots.append(index_of(main_package))
+        
+        # Link each node to the dependencies that are also in our package list
+        while pending:
+            key = pending.pop()
+            deps = package_dependencies.get(key, set())
+            graph.nodes[indices[key]].dep_indices = [
+                index_of(dep_name) for dep_name in deps if dep_name in all_packages
+            ]
+        
+        return graph
     
     async def _resolve_packages_traditional(
         self,
         packages: List[str],
         index_url: str,
-        start_time: float
+        start_time: float,
+        top_n: Optional[int] = None
     ) -> DependencyResolution:
         """Traditional dependency resolution for smaller package lists"""
         resolved_packages = {}
-        dependency_trees = []
         conflicts = []
         warnings = []
         
+        # Shared graph so a dependency common to several packages is fetched once
+        graph = ResolutionPayload()
+        node_indices: Dict[tuple, int] = {}
+        expanded: Set[int] = set()
+        
         try:
+            # Fetch details for every requested package concurrently up front
+            package_names = []
+            for package_spec in packages:
+                try:
+                    package_names.append(self._parse_package_spec(package_spec)[0])
+                except Exception:
+                    continue  # Reported when the spec is resolved below
+            package_names = list(dict.fromkeys(package_names))
+            details_results = await self._gather_bounded(
+                self.get_package_details(package_name, index_url) for package_name in package_names
+            )
+            details_by_name = dict(zip(package_names, details_results))
+            
             for package_spec in packages:
                 try:
                     # Parse package specification
@@ -511,7 +892,9 @@ class PackageService:
                     logger.info(f"Resolving {package_name} with constraint: {version_constraint}")
                     
                     # Get package details
-                    package_details = await self.get_package_details(package_name, index_url)
+                    package_details = details_by_name.get(package_name)
+                    if isinstance(package_details, Exception):
+                        raise package_details
                     
                     if not package_details:
                         warnings.append(f"Package '{package_name}' not found")
@@ -546,12 +929,11 @@ class PackageService:
                         
                         # Build dependency tree (simplified) - only for successfully resolved packages
                         try:
-                            dep_tree = await self._build_dependency_tree(
+                            root = await self._add_dependency_node(
+                                graph, node_indices, expanded,
                                 package_name, selected_version, index_url, depth=0, max_depth=2
                             )
-                            
-                            if dep_tree:
-                                dependency_trees.append(dep_tree)
+                            graph.roots.append(root)
                         except Exception as tree_error:
                             logger.warning(f"Failed to build dependency tree for {package_name}: {tree_error}")
                             # Continue without dependency tree
@@ -562,22 +944,9 @@ class PackageService:
                     continue
             
             # Get hash information for resolved packages
-            resolved_packages_with_hash = {}
-            for package_name, version in resolved_packages.items():
-                try:
-                    package_hash = await self.get_package_hash(package_name, version, index_url)
-                    resolved_packages_with_hash[package_name] = ResolvedPackage(
-                        version=version,
-                        sha256_hash=package_hash
-                    )
-                    logger.info(f"Hash for {package_name}=={version}: {'found' if package_hash else 'not found'}")
-                except Exception as e:
-                    logger.warning(f"Failed to get hash for {package_name}=={version}: {e}")
-                    resolved_packages_with_hash[package_name] = ResolvedPackage(
-                        version=version,
-                        sha256_hash=None
-                    )
+            resolved_packages_with_hash = await self.get_package_hashes(resolved_packages, index_url, top_n)
 
+            dependency_trees = graph.to_tree(max_depth=1)
             end_time = asyncio.get_event_loop().time()
             
             return DependencyResolution(
@@ -593,73 +962,63 @@ class PackageService:
             logger.error(f"Dependency resolution failed: {e}")
             raise
     
-    async def _build_dependency_tree(
+    async def _add_dependency_node(
         self,
+        graph: ResolutionPayload,
+        node_indices: Dict[tuple, int],
+        expanded: Set[int],
         package_name: str,
         version_info: VersionInfo,
         index_url: str,
         depth: int = 0,
-        max_depth: int = 2,
-        visited: Optional[Set[str]] = None
-    ) -> Optional[DependencyTree]:
-        """Build dependency tree recursively (simplified)"""
-        if visited is None:
-            visited = set()
-        
-        # Prevent circular dependencies and excessive depth
-        if depth >= max_depth or package_name in visited:
-            return DependencyTree(name=package_name, version=version_info.version)
-        
-        visited.add(package_name)
-        tree = DependencyTree(name=package_name, version=version_info.version)
-        
+        max_depth: int = 2
+    ) -> int:
+        """Add a package and its dependencies to the graph, returning its node index"""
+        key = (package_name, version_info.version)
+        index = node_indices.get(key)
+        if index is None:
+            index = len(graph.nodes)
+            node_indices[key] = index
+            graph.nodes.append(ResolvedNode(name=package_name, version=version_info.version))
+        elif index in expanded:
+            return index
+        
+        # Prevent excessive depth; cycles are cut when the tree is rebuilt
         if version_info.dependencies and depth < max_depth - 1:
+            expanded.add(index)
+            dep_indices = []
             for dep in version_info.dependencies[:3]:  # Reduced limit to prevent explosion
                 try:
-                    if dep.name not in visited:  # Skip if already visited
-                        dep_details = await self.get_package_details(dep.name, index_url)
-                        if dep_details:
-                            # Use latest version for simplicity
-                            latest_version = VersionInfo(version=dep_details.latest_version)
-                            
-                            subtree = await self._build_dependency_tree(
-                                dep.name, latest_version, index_url, depth + 1, max_depth, visited.copy()
-                            )
-                            
-                            if subtree:
-                                tree.dependencies.append(subtree)
+                    dep_details = await self.get_package_details(dep.name, index_url)
+                    if dep_details:
+                        # Use latest version for simplicity
+                        latest_version = VersionInfo(version=dep_details.latest_version)
+                        dep_indices.append(await self._add_dependency_node(
+                            graph, node_indices, expanded,
+                            dep.name, latest_version, index_url, depth + 1, max_depth
+                        ))
                 except Exception as e:
                     logger.warning(f"Failed to resolve dependency {dep.name}: {e}")
                     continue
+            graph.nodes[index].dep_indices = dep_indices
         
-        return tree
+        return index
     
     def _parse_package_spec(self, package_spec: str) -> tuple[str, Optional[str]]:
         """Parse package specification like 'requests>=2.25.0' or 'package[extra]==1.0.0'"""
         # First, strip environment markers (everything after ';')
-        clean_spec = package_spec.split(';')[0].strip()
-        
-        for op in ['>=', '<=', '==', '!=', '>', '<', '~=']:
-            if op in clean_spec:
-                parts = clean_spec.split(op, 1)
-                if len(parts) == 2:
-                    package_name_with_extras = parts[0].strip()
-                    # Extract base package name for PyPI lookup (remove extras in square brackets)
-                    if '[' in package_name_with_extras:
-                        base_package_name = package_name_with_extras[:package_name_with_extras.index('[')]
-                        logger.info(f"Extracted base package '{base_package_name}' from '{package_name_with_extras}'")
-                        return base_package_name, f"{op}{parts[1].strip()}"
-                    else:
-                        return package_name_with_extras, f"{op}{parts[1].strip()}"
-        
-        # Handle packages without version constraints
-        package_name = clean_spec.strip()
-        if '[' in package_name:
-            base_package_name = package_name[:package_name.index('[')]
-            logger.info(f"Extracted base package '{base_package_name}' from '{package_name}'")
-            return base_package_name, None
-        
-        return package_name, None
+        clean_spec = package_spec.split(';', 1)[0].strip()
+        
+        match = _SPEC_RE.match(clean_spec)
+        if not match:
+            # Unrecognized format: keep the whole spec as the name
+            return clean_spec, None
+        
+        package_name, extras, op, version = match.groups()
+        if extras:
+            # Extras are dropped for the PyPI lookup
+            logger.info(f"Extracted base package '{package_name}' from '{package_name}{extras}'")
+        return package_name, f"{op}{version}" if op else None
     
     def _select_version(
         self, 
@@ -673,32 +1032,38 @@ class PackageService:
         if not constraint:
             # Return latest version
             try:
-                return max(versions, key=lambda v: parse_version(v.version))
+                return _latest_version(versions)
             except Exception:
                 return versions[0]
         
+        # Exact pins are the most common constraint; when the pinned string is
+        # listed as is, skip the specifier matching entirely
+        pin = constraint.strip()
+        if pin.startswith('==') and '*' not in pin and ',' not in pin:
+            target_version = pin[3:].strip() if pin.startswith('===') else pin[2:].strip()
+            for v in versions:
+                if v.version == target_version:
+                    return v
+        
         try:
-            spec_set = SpecifierSet(constraint)
+            spec_set = _specifier_set(constraint)
             
-            # Filter versions that match the constraint
-            matching_versions = []
+            # Keep the latest version matching the constraint, parsing each
+            # version string once (memoized across calls)
+            best_version = None
+            best_parsed = None
             for v in versions:
                 try:
-                    if spec_set.contains(v.version):
-                        matching_versions.append(v)
-                except Exception as version_error:
+                    parsed = _parse_version(v.version)
+                except InvalidVersion as version_error:
                     logger.debug(f"Failed to check version {v.version} against constraint {constraint}: {version_error}")
                     continue
+                if (best_parsed is None or parsed > best_parsed) and spec_set.contains(parsed):
+                    best_version, best_parsed = v, parsed
             
-            if matching_versions:
-                # Return the latest matching version
-                try:
-                    return max(matching_versions, key=lambda v: parse_version(v.version))
-                except Exception as sort_error:
-                    logger.debug(f"Failed to sort matching versions, returning first match: {sort_error}")
-                    return matching_versions[0]
-            else:
-                logger.warning(f"No versions found matching constraint '{constraint}' for package")
+            if best_version is not None:
+                return best_version
+            logger.warning(f"No versions found matching constraint '{constraint}' for package")
             
         except Exception as e:
             logger.warning(f"Failed to parse version constraint '{constraint}': {e}")
@@ -724,19 +1089,20 @@ class PackageService:
         latest_version = "1.0.0"  # Placeholder
         if cached_package.versions:
             try:
-                latest_version = max(
-                    cached_package.versions,
-                    key=lambda v: parse_version(v.version)
-                ).version
+                latest_version = _latest_version(cached_package.versions).version
             except Exception:
                 latest_version = cached_package.versions[0].version
         
-        # Convert cached versions to VersionInfo objects if needed
+        # Convert cached versions to VersionInfo objects if needed. The rows
+        # were validated when they were written and come back typed from
+        # Prisma, so the models are built without revalidating them
         versions_list = []
         if include_versions and cached_package.versions:
             for cached_version in cached_package.versions:
-                versions_list.append(VersionInfo(
-                    version=cached_version.version,
+                versions_list.append(VersionInfo.model_construct(
+                    # Interned so the many copies of common version strings
+                    # share one object, and parse-cache lookups hit by identity
+                    version=sys.intern(cached_version.version),
                     release_date=cached_version.releaseDate,
                     yanked=cached_version.yanked or False,
                     yanked_reason=None  # Not stored in cache schema
@@ -746,7 +1112,7 @@ class PackageService:
         dependencies = []
         if include_dependencies and cached_package.dependencies:
             dependencies = [
-                DependencyInfo(
+                DependencyInfo.model_construct(
                     name=dep.dependencyName,
                     version_spec=dep.versionSpec,
                     optional=dep.optional,
@@ -754,8 +1120,10 @@ class PackageService:
                 ) for dep in cached_package.dependencies
             ]
 
-        return PackageDetails(
-            name=cached_package.name,
+        # Built without validation like the nested models above; the name is
+        # normalized by hand as PackageName would
+        return PackageDetails.model_construct(
+            name=cached_package.name.strip().lower(),
             summary=cached_package.summary,
             description=cached_package.description,
             author=cached_package.author,
@@ -767,25 +1135,33 @@ class PackageService:
             latest_version=latest_version,
             versions=versions_list if include_versions else None,
             dependencies=dependencies if include_dependencies else None,
-            last_updated=cached_package.lastUpdated
+            # Cached timestamps are Unix milliseconds
+            last_updated=datetime.fromtimestamp(cached_package.lastUpdated / 1000, tz=timezone.utc)
         )
     
     async def _convert_raw_to_package_details(
         self,
         package_data: Dict[str, Any],
         include_versions: bool,
-        include_dependencies: bool
+        include_dependencies: bool,
+        only_latest_files: bool = True
     ) -> PackageDetails:
-        """Convert raw PyPI data to PackageDetails model"""
+        """
+        Convert raw PyPI data to PackageDetails model
+        
+        File lists are only built for the latest version unless
+        only_latest_files is False; version details carry the files of
+        any other release, and cached package details never include them.
+        """
         info = package_data.get('info', {})
+        latest_version = info.get('version')
         
         # Convert versions
         versions = []
         if include_versions and 'releases' in package_data:
             for version_str, files in package_data['releases'].items():
-                version_info = VersionInfo(
-                    version=version_str,
-                    files=[
+                if files and (version_str == latest_version or not only_latest_files):
+                    file_infos = [
                         FileInfo(
                             filename=f.get('filename', ''),
                             url=f.get('url', ''),
@@ -794,38 +1170,27 @@ class PackageService:
                             md5_digest=f.get('md5_digest'),
                             sha256_digest=f.get('digests', {}).get('sha256')
                         ) for f in files
-                    ] if files else []
-                )
-                versions.append(version_info)
+                    ]
+                else:
+                    file_infos = []
+                versions.append(VersionInfo(version=version_str, files=file_infos))
         
         # Convert dependencies
         dependencies = []
         if include_dependencies and info.get('requires_dist'):
-            async with self.pypi_client as client:
-                raw_deps = await client.extract_dependencies(package_data)
-                dependencies = [
-                    DependencyInfo(
-                        name=dep['name'],
-                        version_spec=dep.get('version_spec'),
-                        optional=dep.get('optional', False),
-                        extra=dep.get('extra')
-                    ) for dep in raw_deps
-                ]
+            raw_deps = await self.pypi_client.extract_dependencies(package_data)
+            dependencies = [
+                DependencyInfo(
+                    name=dep['name'],
+                    version_spec=dep.get('version_spec'),
+                    optional=dep.get('optional', False),
+                    extra=dep.get('extra')
+                ) for dep in raw_deps
+            ]
         
         return PackageDetails(
             name=info['name'],
-            summary=info.get('summary'),
-            description=info.get('description'),
-            author=info.get('author'),
-            author_email=info.get('author_email'),
-            maintainer=info.get('maintainer'),
-            maintainer_email=info.get('maintainer_email'),
-            license=info.get('license'),
-            homepage=info.get('home_page'),
-            project_urls=info.get('project_urls', {}),
-            keywords=info.get('keywords', '').split(',') if info.get('keywords') else None,
-            classifiers=info.get('classifiers', []),
-            requires_python=info.get('requires_python'),
+            **_raw_info_fields(info),
             latest_version=info['version'],
             versions=versions if include_versions else None,
             dependencies=dependencies if include_dependencies else None
@@ -840,12 +1205,13 @@ class PackageService:
         info = version_data.get('info', {})
         urls = version_data.get('urls', [])
         
+        # pydantic-core parses the ISO 8601 upload times (including a "Z" suffix)
         files = [
             FileInfo(
                 filename=url.get('filename', ''),
                 url=url.get('url', ''),
                 size=url.get('size'),
-                upload_time=datetime.fromisoformat(url['upload_time'].replace('Z', '+00:00')) if url.get('upload_time') else None,
+                upload_time=url.get('upload_time') or None,
                 packagetype=url.get('packagetype'),
                 md5_digest=url.get('md5_digest'),
                 sha256_digest=url.get('digests', {}).get('sha256')
@@ -854,49 +1220,80 @@ class PackageService:
         
         return VersionInfo(
             version=version,
-            summary=info.get('summary'),
-            description=info.get('description'),
-            author=info.get('author'),
-            author_email=info.get('author_email'),
-            license=info.get('license'),
-            homepage=info.get('home_page'),
-            project_urls=info.get('project_urls', {}),
-            keywords=info.get('keywords', '').split(',') if info.get('keywords') else None,
-            classifiers=info.get('classifiers', []),
-            requires_python=info.get('requires_python'),
+            **_raw_info_fields(info),
             files=files
         )
     
     async def validate_index(self, index_url: str) -> bool:
         """Validate that a package index is accessible"""
-        async with self.pypi_client as client:
-            return await client.validate_index(index_url)
+        return await self.pypi_client.validate_index(index_url)
     
-    async def warm_popular_packages(self):
+    async def warm_popular_packages(self, max_concurrency: int = 20):
         """Background task to warm cache with popular packages"""
         logger.info("Starting to warm cache with popular packages")
         
-        async with self.pypi_client as client:
-            for i, package_name in enumerate(self.popular_packages[:10]):  # Limit to prevent overload
+        packages = self.popular_packages[:10]  # Limit to prevent overload
+        
+        # Skip packages whose cached data is still fresh (one batched lookup),
+        # so restarts don't go back to PyPI for them
+        cached_packages = await self.cache_service.get_packages(list(packages))
+        packages = [
+            package_name for package_name, cached_package in zip(packages, cached_packages)
+            if cached_package is None
+        ]
+        if not packages:
+            logger.info("Popular packages are already cached")
+            return
+        
+        semaphore = asyncio.Semaphore(max_concurrency)
+        
+        async def warm_one(package_name: str):
+            async with semaphore:
                 try:
-                    logger.info(f"Warming cache for package {i+1}/10: {package_name}")
+                    logger.info(f"Warming cache for package: {package_name}")
                     await self.get_package_details(package_name)
-                    await asyncio.sleep(1.0)  # Increased rate limiting
                 except Exception as e:
                     logger.warning(f"Failed to warm cache for {package_name}: {e}")
         
+        # PyPIClient's rate limiter still paces the outbound requests
+        async with asyncio.TaskGroup() as tg:
+            for package_name in packages:
+                tg.create_task(warm_one(package_name))
+        
         logger.info("Finished warming cache")
     
+    def invalidate(self, package_name: Optional[str] = None):
+        """Drop in-process cached data for a package, or for every package if none is given"""
+        self.pypi_client.invalidate(package_name)
+        if package_name is None:
+            self._details_cache.clear()
+            self._hash_cache.clear()
+            self._name_indexes.clear()
+            self._last_searches.clear()
+            return
+        
+        for cache in (self._details_cache, self._hash_cache):
+            for key in [key for key in cache.keys() if key[0] == package_name]:
+                cache.pop(key, None)
+        for name_index in self._name_indexes.values():
+            name_index.discard(package_name)
+        # Narrowed result lists may still hold the package
+        self._last_searches.clear()
+    
     async def refresh_package_cache(self, package_name: str, index_url: Optional[str] = None):
         """Force refresh cache for a specific package"""
+        self.invalidate(package_name)
         await self.cache_service.clear_package_cache(package_name)
         await self.get_package_details(package_name, index_url)
     
     async def refresh_popular_packages_cache(self, index_url: Optional[str] = None):
         """Refresh cache for all popular packages"""
-        for package_name in self.popular_packages:
-            try:
-                await self.refresh_package_cache(package_name, index_url)
-                await asyncio.sleep(0.2)  # Rate limiting
-            except Exception as e:
-                logger.warning(f"Failed to refresh cache for {package_name}: {e}")
\ No newline at end of file
+        # PyPIClient's rate limiter paces the outbound requests, so there is
+        # no need to sleep between packages
+        results = await self._gather_bounded(
+            (self.refresh_package_cache(package_name, index_url) for package_name in self.popular_packages),
+            max_concurrency=8
+        )
+        for package_name, result in zip(self.popular_packages, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Failed to refresh cache for {package_name}: {result}")
\ No newline at end of file
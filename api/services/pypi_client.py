@@ -4,127 +4,441 @@ PyPI API client for fetching package information
 
 import httpx
 import asyncio
-from typing import Dict, List, Optional, Any, Set
+from typing import Deque, Dict, Iterator, List, Optional, Any, Set, Tuple
 from datetime import datetime
 import logging
 from urllib.parse import urljoin, quote
-from bs4 import BeautifulSoup
-import json
+from cachetools import TTLCache
+from lxml import etree
+import orjson
 import re
-from packaging.version import parse as parse_version, InvalidVersion
+from packaging.version import Version, parse as parse_version, InvalidVersion
+from packaging.requirements import InvalidRequirement, Requirement
 from packaging.specifiers import SpecifierSet
+from packaging.utils import (
+    InvalidSdistFilename, InvalidWheelFilename, canonicalize_name,
+    parse_sdist_filename, parse_wheel_filename
+)
+import random
+import threading
 import time
+from collections import deque
+from enum import Enum
+from functools import lru_cache
+from itertools import islice
 
 logger = logging.getLogger(__name__)
 
+_ZERO_VERSION = parse_version("0.0.0")
+
+@lru_cache(maxsize=16384)
+def _parsed_version(version: str) -> Optional[Version]:
+    """Parse a version string, or None if it is invalid; the same strings recur across packages"""
+    try:
+        return parse_version(version)
+    except InvalidVersion:
+        return None
+
+def _version_sort_key(version: str) -> Version:
+    """Parse a version for ordering, treating invalid versions as 0.0.0"""
+    parsed = _parsed_version(version)
+    return _ZERO_VERSION if parsed is None else parsed
+
+# Popular packages, matched against search queries by name and used by
+# PackageService to warm and refresh the cache
+POPULAR_PACKAGES = (
+    'requests', 'numpy', 'pandas', 'django', 'flask', 'fastapi',
+    'pytest', 'setuptools', 'wheel', 'pip', 'black', 'flake8',
+    'mypy', 'click', 'pydantic', 'sqlalchemy', 'alembic', 'jinja2',
+    'matplotlib', 'seaborn', 'scikit-learn', 'tensorflow', 'torch',
+    'opencv-python', 'pillow', 'beautifulsoup4', 'lxml', 'httpx',
+    'aiohttp', 'boto3', 'celery', 'redis', 'psycopg2', 'pymongo',
+    'selenium', 'scrapy', 'jupyter', 'ipython', 'notebook', 'uvicorn',
+    'gunicorn', 'asyncio', 'typing-extensions', 'pyyaml', 'toml',
+    'rich', 'typer', 'poetry', 'pipenv', 'virtualenv', 'tox'
+)
+
+_EXTRA_MARKER_RE = re.compile(r'\bextra\s*==\s*[\'"]([^\'"]+)[\'"]')
+
+def _retry_after_seconds(retry_after: Optional[str]) -> Optional[float]:
+    """Seconds from a numeric Retry-After header, or None if absent or in HTTP-date form"""
+    if not retry_after:
+        return None
+    try:
+        return max(float(retry_after), 0.0)
+    except ValueError:
+        return None
+
+def _retry_delay(attempt: int, max_delay: float, retry_after: Optional[float] = None) -> float:
+    """
+    Seconds to wait before retrying a request, at most max_delay
+    
+    Honours Retry-After when given, otherwise backs off exponentially;
+    up to 50% random jitter keeps concurrent retries from landing together.
+    """
+    delay = float(2 ** attempt) if retry_after is None else retry_after
+    return min(delay + random.uniform(0, delay / 2), max_delay)
+
+def _match_rank(query_lower: str, package_name: str) -> Tuple[int, int]:
+    """Sort key for a name containing the query: exact, then prefix, then other matches, shorter names first"""
+    if package_name == query_lower:
+        return 0, 0
+    return (1 if package_name.startswith(query_lower) else 2), len(package_name)
+
+@lru_cache(maxsize=8192)
+def _split_requirement(requirement: str) -> Tuple[str, Optional[str], Optional[str], Tuple[str, ...]]:
+    """
+    Split a requirement string into (name, version spec, marker, extras)
+    
+    Requirement strings recur across packages and releases, so the result
+    is memoized; callers get a fresh dict from PyPIClient._parse_requirement.
+    Raises InvalidRequirement for strings that aren't PEP 508.
+    """
+    req = Requirement(requirement)
+    return (
+        req.name,
+        str(req.specifier) or None,
+        str(req.marker) if req.marker else None,
+        tuple(sorted(req.extras)),
+    )
+
+_NAME_SEPARATORS_RE = re.compile(r'[-_.]+')
+_PLATFORM_SUFFIX_RE = re.compile(r'[-_](py\d|cp\d|pp\d|win|linux|macos|any)')
+
+@lru_cache(maxsize=4096)
+def _filename_patterns(package_name: str) -> Tuple[re.Pattern, ...]:
+    """Compiled patterns matching a package's distribution filenames, capturing the rest after the name"""
+    # Normalize package name for matching
+    normalized_package = _NAME_SEPARATORS_RE.sub('_', package_name).lower()
+    return tuple(
+        re.compile(pattern, re.IGNORECASE)
+        for pattern in (
+            rf'{re.escape(normalized_package)}_(.+)',
+            rf'{re.escape(normalized_package)}-(.+)',
+            rf'{re.escape(package_name)}_(.+)',
+            rf'{re.escape(package_name)}-(.+)',
+        )
+    )
+
+@lru_cache(maxsize=4096)
+def _canonical_name(package_name: str) -> str:
+    """PEP 503 normalized project name; memoized since every file of a package asks for it"""
+    return canonicalize_name(package_name)
+
+def _parse_distribution_filename(filename: str) -> Optional[Tuple[str, str]]:
+    """
+    (canonical name, version) of a wheel (PEP 427) or sdist (PEP 625) filename
+    
+    Returns None for other formats and for filenames that don't follow the spec.
+    """
+    try:
+        if filename.endswith('.whl'):
+            name, version, _, _ = parse_wheel_filename(filename)
+        elif filename.endswith(('.tar.gz', '.zip')):
+            name, version = parse_sdist_filename(filename)
+        else:
+            return None
+    except (InvalidWheelFilename, InvalidSdistFilename):
+        return None
+    return name, str(version)
+
+def _iter_links(content: bytes, chunk_size: int = 1 << 16) -> Iterator[Tuple[Dict[str, str], str]]:
+    """
+    Yield (attributes, stripped text) for each <a> tag in an HTML page
+    
+    Parsed incrementally with lxml, dropping each link once it has been
+    yielded, so memory stays flat even for the root simple index with
+    hundreds of thousands of links.
+    """
+    if not content.strip():
+        return
+    
+    parser = etree.HTMLPullParser(events=('end',), tag='a')
+    
+    def read_links() -> Iterator[Tuple[Dict[str, str], str]]:
+        for _, element in parser.read_events():
+            text = ''.join(element.itertext()) if len(element) else (element.text or '')
+            yield dict(element.attrib), text.strip()
+            element.clear()
+            # Drop already-processed siblings so the tree doesn't grow
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+    
+    for start in range(0, len(content), chunk_size):
+        parser.feed(content[start:start + chunk_size])
+        yield from read_links()
+    
+    # Closing flushes elements left open at the end, e.g. a trailing <a>
+    parser.close()
+    yield from read_links()
+
+def _search_result(package_name: str, package_info: Dict[str, Any]) -> Dict[str, Any]:
+    """Build a search result entry from a package's JSON info"""
+    info = package_info.get('info', {})
+    return {
+        'name': package_name,
+        'summary': info.get('summary'),
+        'version': info.get('version'),
+        'description': info.get('description'),
+        'author': info.get('author'),
+    }
+
+class RateLimitStrategy(str, Enum):
+    """How PyPIClient paces its requests"""
+    TOKEN_BUCKET = "token_bucket"      # Bursts up to a capacity, then the sustained rate
+    LEAKY_BUCKET = "leaky_bucket"      # Evenly spaced at the sustained rate
+    SLIDING_WINDOW = "sliding_window"  # At most N requests in any 60 second window
+
 class PyPIClient:
     """Client for interacting with PyPI and custom package indexes"""
     
-    def __init__(self, timeout: int = 30, max_retries: int = 3):
+    def __init__(
+        self,
+        timeout: int = 30,
+        max_retries: int = 3,
+        rate_limit_strategy: RateLimitStrategy = RateLimitStrategy.TOKEN_BUCKET
+    ):
         self.timeout = timeout
         self.max_retries = max_retries
-        self.session = None
-        self._session_initialized = False
-        
-        # Enhanced rate limiting
-        self.last_request_time = 0
-        self.min_request_interval = 0.2  # 200ms between requests (more conservative)
-        self.request_count = 0
-        self.request_window_start = time.time()
+        # One pooled HTTP client per event loop (keyed by id of the loop)
+        self._clients: Dict[int, httpx.AsyncClient] = {}
+        self._clients_lock = threading.Lock()
+        
+        # Rate limiting: max_requests_per_minute sustained; the token and
+        # leaky buckets also allow bursts of up to burst_capacity requests
+        self.rate_limit_strategy = RateLimitStrategy(rate_limit_strategy)
         self.max_requests_per_minute = 30  # Limit to 30 requests per minute
+        self.burst_capacity = 10
+        self._refill_rate = self.max_requests_per_minute / 60
+        self._tokens = float(self.burst_capacity)
+        self._last_refill = time.monotonic()
+        self._level = 0.0  # Leaky bucket: requests in the bucket, draining at the sustained rate
+        self._level_updated = time.monotonic()
+        self._window: Deque[float] = deque()  # Sliding window: request times in the last minute
+        # A thread lock, since the client is shared across event loops; it is
+        # never held across an await
+        self._rate_lock = threading.Lock()
+        
+        # Circuit breaker: after breaker_threshold consecutive failed requests,
+        # fail fast for breaker_cooldown seconds instead of hammering the index
+        self.breaker_threshold = 5
+        self.breaker_cooldown = 30.0
+        self._consecutive_failures = 0
+        self._breaker_open_until = 0.0
         
         # Cache for simple index package lists
         self._simple_index_cache: Dict[str, Dict] = {}
+        # Index origin -> monotonic time until which the PEP 691 JSON API is
+        # assumed unsupported there, so mirrors without it get one probe an hour
+        self._json_unsupported_until: Dict[str, float] = {}
+        
+        # Project JSON keyed by (package name, index URL); searches ask for the
+        # same popular packages over and over. Entries are (JSON size in bytes,
+        # parsed JSON) and the cache is bounded by total size, since projects
+        # with many releases (boto3, tensorflow) run to megabytes each
+        self._package_info_cache: TTLCache = TTLCache(
+            maxsize=16 * 1024 * 1024, ttl=600, getsizeof=lambda entry: entry[0]
+        )
+        self._package_info_lock = threading.Lock()
+        # Fetches in progress keyed by (loop id, package name, index URL), so
+        # concurrent callers on the same loop share one request
+        self._package_info_in_flight: Dict[Tuple[int, str, str], asyncio.Task] = {}
     
-    async def _ensure_session(self):
-        """Ensure HTTP session is initialized"""
-        if not self._session_initialized or self.session is None or self.session.is_closed:
-            if self.session and not self.session.is_closed:
-                await self.session.aclose()
-            
-            self.session = httpx.AsyncClient(
-                timeout=self.timeout,
-                follow_redirects=True,
-                headers={
-                    'User-Agent': 'py-reqforge/1.0.0 (PyPI package manager)'
-                }
-            )
-            self._session_initialized = True
+    def _get_client(self) -> httpx.AsyncClient:
+        """
+        Get the HTTP client for the running event loop, creating it on first use
+        
+        Clients are bound to the loop they were created on, so workers that
+        run a fresh loop get their own pool instead of a stale one.
+        """
+        loop_id = id(asyncio.get_running_loop())
+        with self._clients_lock:
+            client = self._clients.get(loop_id)
+            if client is None or client.is_closed:
+                client = httpx.AsyncClient(
+                    http2=True,
+                    limits=httpx.Limits(max_connections=100, max_keepalive_connections=50, keepalive_expiry=30.0),
+                    timeout=httpx.Timeout(self.timeout, connect=5.0),
+                    follow_redirects=True,
+                    headers={
+                        'User-Agent': 'py-reqforge/1.0.0 (PyPI package manager)'
+                    }
+                )
+                self._clients[loop_id] = client
+        return client
         
     async def __aenter__(self):
-        await self._ensure_session()
+        self._get_client()
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        # Don't close session here - keep it persistent
+        # Don't close the client here - keep it persistent
         pass
     
     async def close(self):
-        """Explicitly close the session"""
-        if self.session and not self.session.is_closed:
-            await self.session.aclose()
-            self._session_initialized = False
+        """Explicitly close the HTTP client for the running event loop"""
+        loop_id = id(asyncio.get_running_loop())
+        with self._clients_lock:
+            client = self._clients.pop(loop_id, None)
+        if client and not client.is_closed:
+            await client.aclose()
     
     async def _rate_limit(self):
-        """Enhanced rate limiting to be respectful to PyPI"""
-        now = time.time()
-        
-        # Reset window if more than a minute has passed
-        if now - self.request_window_start > 60:
-            self.request_count = 0
-            self.request_window_start = now
-        
-        # Check if we've exceeded the rate limit
-        if self.request_count >= self.max_requests_per_minute:
-            sleep_time = 60 - (now - self.request_window_start) + 1
-            logger.warning(f"Rate limit exceeded, sleeping for {sleep_time:.1f}s")
-            await asyncio.sleep(sleep_time)
-            self.request_count = 0
-            self.request_window_start = time.time()
-        
-        # Apply minimum interval between requests
-        elapsed = now - self.last_request_time
-        if elapsed < self.min_request_interval:
-            await asyncio.sleep(self.min_request_interval - elapsed)
-        
-        self.last_request_time = time.time()
-        self.request_count += 1
+        """
+        Rate limiting to be respectful to PyPI
+        
+        Every strategy reserves a send time for the request under the lock and
+        then sleeps until it is due, so concurrent requests queue up in order
+        instead of all waking at once.
+        """
+        with self._rate_lock:
+            now = time.monotonic()
+            if self.rate_limit_strategy is RateLimitStrategy.LEAKY_BUCKET:
+                send_at = self._reserve_leaky_bucket(now)
+            elif self.rate_limit_strategy is RateLimitStrategy.SLIDING_WINDOW:
+                send_at = self._reserve_sliding_window(now)
+            else:
+                send_at = self._reserve_token_bucket(now)
+        
+        wait_time = send_at - now
+        if wait_time > 0:
+            logger.debug(f"Rate limit reached, waiting {wait_time:.1f}s")
+            await asyncio.sleep(wait_time)
+    
+    def _reserve_token_bucket(self, now: float) -> float:
+        """Take a token, reserving a future one (the count goes negative) if the bucket is empty"""
+        self._tokens = min(
+            self.burst_capacity,
+            self._tokens + (now - self._last_refill) * self._refill_rate
+        )
+        self._last_refill = now
+        self._tokens -= 1
+        return now - self._tokens / self._refill_rate if self._tokens < 0 else now
+    
+    def _reserve_leaky_bucket(self, now: float) -> float:
+        """
+        Add a request to the bucket, which leaks at the sustained rate
+        
+        Requests go out at once while the bucket has room, so an idle client
+        can burst up to burst_capacity; past that the level keeps rising and
+        each request waits until enough has leaked out to make room for it.
+        """
+        self._level = max(0.0, self._level - (now - self._level_updated) * self._refill_rate)
+        self._level_updated = now
+        self._level += 1
+        overflow = self._level - self.burst_capacity
+        return now + overflow / self._refill_rate if overflow > 0 else now
+    
+    def _reserve_sliding_window(self, now: float) -> float:
+        """Allow max_requests_per_minute requests in any 60 second window"""
+        window = self._window
+        while window and window[0] <= now - 60:
+            window.popleft()
+        if len(window) < self.max_requests_per_minute:
+            send_at = now
+        else:
+            # Wait until the request that many places back leaves the window
+            send_at = max(now, window[-self.max_requests_per_minute] + 60)
+        window.append(send_at)
+        return send_at
     
     async def _make_request(self, url: str, retries: int = None) -> Optional[httpx.Response]:
         """Make HTTP request with retry logic and rate limiting"""
         if retries is None:
             retries = self.max_retries
         
-        await self._ensure_session()
+        if self._breaker_is_open(url):
+            return None
+        
+        client = self._get_client()
         await self._rate_limit()
         
         for attempt in range(retries + 1):
             try:
-                response = await self.session.get(url)
+                response = await client.get(url)
                 if response.status_code == 200:
+                    self._record_request_result(True)
                     return response
                 elif response.status_code == 404:
+                    self._record_request_result(True)
                     return None
                 elif response.status_code == 429:  # Rate limited
-                    wait_time = 2 ** attempt
-                    logger.warning(f"Rate limited, waiting {wait_time}s before retry")
-                    await asyncio.sleep(wait_time)
-                    continue
+                    retry_after = _retry_after_seconds(response.headers.get('Retry-After'))
+                    if retry_after is not None and retry_after > self.timeout:
+                        # Longer than any caller should wait: give up, and hold
+                        # every request until the index is ready again
+                        logger.warning(f"Rate limited for {retry_after:.0f}s, pausing requests")
+                        self._open_breaker(retry_after)
+                        return None
+                    wait_time = _retry_delay(attempt, self.timeout, retry_after)
+                    logger.warning(f"Rate limited, waiting {wait_time:.1f}s before retry")
+                elif response.status_code >= 500:
+                    logger.warning(f"HTTP {response.status_code} for {url}")
+                    wait_time = _retry_delay(attempt, self.timeout)
                 else:
+                    # Other client errors won't change on retry
                     logger.warning(f"HTTP {response.status_code} for {url}")
-                    if attempt < retries:
-                        await asyncio.sleep(1)
-                        continue
+                    self._record_request_result(True)
                     return None
             except Exception as e:
                 logger.error(f"Request failed for {url}: {e}")
-                if attempt < retries:
-                    await asyncio.sleep(2 ** attempt)
-                    continue
-                return None
+                wait_time = _retry_delay(attempt, self.timeout)
+            
+            if attempt < retries:
+                await asyncio.sleep(wait_time)
         
+        self._record_request_result(False)
         return None
     
+    def _record_request_result(self, succeeded: bool):
+        """Track consecutive failures, opening the circuit breaker past the threshold"""
+        if succeeded:
+            self._consecutive_failures = 0
+            return
+        
+        self._consecutive_failures += 1
+        if self._consecutive_failures >= self.breaker_threshold:
+            logger.warning(
+                f"{self._consecutive_failures} consecutive request failures, "
+                f"pausing requests for {self.breaker_cooldown}s"
+            )
+            self._open_breaker(self.breaker_cooldown)
+    
+    def _open_breaker(self, seconds: float):
+        """Fail every request fast for the next few seconds"""
+        self._breaker_open_until = max(self._breaker_open_until, time.monotonic() + seconds)
+        self._consecutive_failures = 0
+    
+    def _breaker_is_open(self, url: str) -> bool:
+        """Whether requests are currently paused by the circuit breaker"""
+        if time.monotonic() < self._breaker_open_until:
+            logger.warning(f"Circuit breaker open, skipping request for {url}")
+            return True
+        return False
+    
+    async def _send_json_request(self, simple_url: str, headers: Dict[str, str]) -> Optional[httpx.Response]:
+        """
+        Send one PEP 691 JSON request, counted by the circuit breaker
+        
+        Not retried, since callers fall back to the HTML page; returns None
+        when the breaker is open or the request fails outright.
+        """
+        if self._breaker_is_open(simple_url):
+            return None
+        
+        client = self._get_client()
+        await self._rate_limit()
+        
+        try:
+            response = await client.get(simple_url, headers=headers)
+        except Exception as e:
+            logger.debug(f"JSON request failed for {simple_url}: {e}")
+            self._record_request_result(False)
+            return None
+        
+        self._record_request_result(response.status_code != 429 and response.status_code < 500)
+        return response
+    
     async def get_package_info(self, package_name: str, index_url: str = "https://pypi.org") -> Optional[Dict[str, Any]]:
         """
         Get package information from PyPI JSON API
@@ -136,9 +450,39 @@ class PyPIClient:
         Returns:
             Package information dictionary or None if not found
         """
-        if index_url.endswith('/'):
-            index_url = index_url.rstrip('/')
+        index_url = index_url.rstrip('/')
+        
+        cache_key = (package_name.lower(), index_url)
+        flight_key = (id(asyncio.get_running_loop()), *cache_key)
+        with self._package_info_lock:
+            cached = self._package_info_cache.get(cache_key)
+            if cached is not None:
+                return cached[1]
             
+            task = self._package_info_in_flight.get(flight_key)
+            if task is None:
+                task = asyncio.ensure_future(self._fetch_and_cache_package_info(package_name, index_url))
+                self._package_info_in_flight[flight_key] = task
+                task.add_done_callback(lambda _: self._package_info_in_flight.pop(flight_key, None))
+        
+        # Shielded so one caller being cancelled doesn't cancel the fetch for the others
+        return await asyncio.shield(task)
+    
+    async def _fetch_and_cache_package_info(self, package_name: str, index_url: str) -> Optional[Dict[str, Any]]:
+        """Fetch package information and store it in the in-process cache"""
+        package_info, size = await self._fetch_package_info(package_name, index_url)
+        if package_info and size <= self._package_info_cache.maxsize:
+            with self._package_info_lock:
+                self._package_info_cache[(package_name.lower(), index_url)] = (size, package_info)
+        return package_info
+    
+    async def _fetch_package_info(self, package_name: str, index_url: str) -> Tuple[Optional[Dict[str, Any]], int]:
+        """
+        Fetch package information from the index, bypassing the in-process cache
+        
+        Returns the information with its size as JSON in bytes, which
+        weights it in the cache.
+        """
         # Try JSON API first (PyPI only)
         if 'pypi.org' in index_url:
             json_url = f"{index_url}/pypi/{quote(package_name)}/json"
@@ -146,12 +490,24 @@ class PyPIClient:
             
             if response:
                 try:
-                    return response.json()
+                    return orjson.loads(response.content), len(response.content)
                 except Exception as e:
                     logger.error(f"Failed to parse JSON for {package_name}: {e}")
         
         # Fall back to simple index parsing
-        return await self._get_package_from_simple_index(package_name, index_url)
+        package_info = await self._get_package_from_simple_index(package_name, index_url)
+        return package_info, len(orjson.dumps(package_info)) if package_info else 0
+    
+    def invalidate(self, package_name: Optional[str] = None):
+        """Drop cached project JSON for a package, or for every package if none is given"""
+        with self._package_info_lock:
+            if package_name is None:
+                self._package_info_cache.clear()
+                return
+            
+            package_name = package_name.lower()
+            for key in [key for key in self._package_info_cache.keys() if key[0] == package_name]:
+                self._package_info_cache.pop(key, None)
     
     async def get_package_version_info(self, package_name: str, version: str, index_url: str = "https://pypi.org") -> Optional[Dict[str, Any]]:
         """
@@ -165,8 +521,7 @@ class PyPIClient:
         Returns:
             Version information dictionary or None if not found
         """
-        if index_url.endswith('/'):
-            index_url = index_url.rstrip('/')
+        index_url = index_url.rstrip('/')
             
         # Try JSON API first (PyPI only)
         if 'pypi.org' in index_url:
@@ -175,7 +530,7 @@ class PyPIClient:
             
             if response:
                 try:
-                    return response.json()
+                    return orjson.loads(response.content)
                 except Exception as e:
                     logger.error(f"Failed to parse JSON for {package_name} {version}: {e}")
         
@@ -209,43 +564,42 @@ class PyPIClient:
     
     async def _get_package_simple_json(self, simple_url: str) -> Optional[Dict[str, Any]]:
         """Get package info using JSON API (PEP 691)"""
-        await self._ensure_session()
-        await self._rate_limit()
+        if not self._json_api_supported(simple_url):
+            return None
+        
+        response = await self._send_json_request(
+            simple_url,
+            {
+                'Accept': 'application/vnd.pypi.simple.v1+json',
+                'User-Agent': 'py-reqforge/1.0.0 (PyPI package manager)'
+            }
+        )
+        if response is None:
+            return None
         
         try:
-            response = await self.session.get(
-                simple_url,
-                headers={
-                    'Accept': 'application/vnd.pypi.simple.v1+json',
-                    'User-Agent': 'py-reqforge/1.0.0 (PyPI package manager)'
-                }
-            )
+            self._record_json_support(simple_url, response)
             
             if response.status_code == 200:
-                data = response.json()
+                data = orjson.loads(response.content)
                 
                 # Convert PEP 691 format to PyPI-like structure
                 files = data.get('files', [])
                 if not files:
                     return None
                 
-                # Group files by version
-                files_by_version = {}
-                versions = set()
+                # Group files by version; the keys double as the version set
+                files_by_version: Dict[str, List[Dict[str, Any]]] = {}
+                package_name = data.get('name', '')
                 
                 for file_info in files:
                     filename = file_info.get('filename', '')
-                    package_name = data.get('name', '')
                     
                     # Extract version from filename
                     version = self._extract_version_from_filename(filename, package_name)
                     if version:
-                        versions.add(version)
-                        if version not in files_by_version:
-                            files_by_version[version] = []
-                        
                         # Convert to PyPI-like file info
-                        pypi_file_info = {
+                        files_by_version.setdefault(version, []).append({
                             'filename': filename,
                             'url': file_info.get('url', ''),
                             'packagetype': self._get_package_type(filename),
@@ -254,15 +608,13 @@ class PyPIClient:
                             'requires_python': file_info.get('requires-python'),
                             'yanked': file_info.get('yanked', False),
                             'hashes': file_info.get('hashes', {})
-                        }
-                        
-                        files_by_version[version].append(pypi_file_info)
+                        })
                 
-                if not versions:
+                if not files_by_version:
                     return None
                 
                 # Get latest version
-                latest_version = max(versions, key=lambda v: parse_version(v) if self._is_valid_version(v) else parse_version("0.0.0"))
+                latest_version = max(files_by_version, key=_version_sort_key)
                 
                 return {
                     'info': {
@@ -290,6 +642,20 @@ class PyPIClient:
         
         return None
     
+    def _json_api_supported(self, simple_url: str) -> bool:
+        """Whether the index serving simple_url is worth a PEP 691 JSON request"""
+        unsupported_until = self._json_unsupported_until.get(urljoin(simple_url, '/'))
+        return unsupported_until is None or time.monotonic() >= unsupported_until
+    
+    def _record_json_support(self, simple_url: str, response: httpx.Response):
+        """Remember for an hour when an index answered a JSON request without JSON"""
+        if response.status_code in (406, 415) or (
+            response.status_code == 200
+            and 'json' not in response.headers.get('content-type', '')
+        ):
+            logger.info(f"{urljoin(simple_url, '/')} does not serve the JSON simple API, using HTML")
+            self._json_unsupported_until[urljoin(simple_url, '/')] = time.monotonic() + 3600
+    
     async def _get_package_simple_html(self, simple_url: str, package_name: str) -> Optional[Dict[str, Any]]:
         """Get package info using HTML parsing (fallback)"""
         response = await self._make_request(simple_url)
@@ -298,45 +664,35 @@ class PyPIClient:
             return None
             
         try:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            links = soup.find_all('a')
-            
-            if not links:
-                return None
-            
-            # Extract version information from file links
-            versions = {}
-            files_by_version = {}
+            # Extract version information from file links as they are parsed;
+            # the keys double as the version set
+            files_by_version: Dict[str, List[Dict[str, Any]]] = {}
             
-            for link in links:
-                href = link.get('href', '')
-                filename = link.get_text().strip()
-                
+            for link, filename in _iter_links(response.content):
                 # Extract version from filename
                 version = self._extract_version_from_filename(filename, package_name)
                 if version:
-                    if version not in versions:
-                        versions[version] = []
-                        files_by_version[version] = []
-                    
                     file_info = {
                         'filename': filename,
-                        'url': href,
+                        'url': link.get('href', ''),
                         'packagetype': self._get_package_type(filename)
                     }
                     
                     # Extract additional metadata from attributes
-                    for attr in ['data-requires-python', 'data-yanked']:
-                        if link.get(attr):
-                            file_info[attr.replace('data-', '').replace('-', '_')] = link.get(attr)
+                    requires_python = link.get('data-requires-python')
+                    if requires_python:
+                        file_info['requires_python'] = requires_python
+                    yanked = link.get('data-yanked')
+                    if yanked:
+                        file_info['yanked'] = yanked
                     
-                    files_by_version[version].append(file_info)
+                    files_by_version.setdefault(version, []).append(file_info)
             
-            if not versions:
+            if not files_by_version:
                 return None
             
             # Create PyPI-like structure
-            latest_version = max(versions.keys(), key=lambda v: parse_version(v) if self._is_valid_version(v) else parse_version("0.0.0"))
+            latest_version = max(files_by_version, key=_version_sort_key)
             
             return {
                 'info': {
@@ -365,6 +721,12 @@ class PyPIClient:
     
     def _extract_version_from_filename(self, filename: str, package_name: str) -> Optional[str]:
         """Extract version from package filename"""
+        # Wheels and sdists have a well-defined layout; the patterns below are
+        # only for eggs and filenames that don't follow the spec
+        parsed = _parse_distribution_filename(filename)
+        if parsed is not None and parsed[0] == _canonical_name(package_name):
+            return parsed[1]
+        
         # Remove file extensions
         base_name = filename
         for ext in ['.tar.gz', '.zip', '.whl', '.egg']:
@@ -372,23 +734,13 @@ class PyPIClient:
                 base_name = base_name[:-len(ext)]
                 break
         
-        # Normalize package name for matching
-        normalized_package = re.sub(r'[-_.]+', '_', package_name).lower()
-        
         # Try various patterns to extract version
-        patterns = [
-            rf'{re.escape(normalized_package)}_(.+)',
-            rf'{re.escape(normalized_package)}-(.+)',
-            rf'{re.escape(package_name)}_(.+)',
-            rf'{re.escape(package_name)}-(.+)',
-        ]
-        
-        for pattern in patterns:
-            match = re.match(pattern, base_name, re.IGNORECASE)
+        for pattern in _filename_patterns(package_name):
+            match = pattern.match(base_name)
             if match:
                 version_part = match.group(1)
                 # Remove build/platform info from version
-                version_part = re.split(r'[-_](py\d|cp\d|pp\d|win|linux|macos|any)', version_part)[0]
+                version_part = _PLATFORM_SUFFIX_RE.split(version_part, maxsplit=1)[0]
                 if self._is_valid_version(version_part):
                     return version_part
         
@@ -396,11 +748,7 @@ class PyPIClient:
     
     def _is_valid_version(self, version: str) -> bool:
         """Check if version string is valid"""
-        try:
-            parse_version(version)
-            return True
-        except InvalidVersion:
-            return False
+        return _parsed_version(version) is not None
     
     def _get_package_type(self, filename: str) -> str:
         """Determine package type from filename"""
@@ -445,59 +793,28 @@ class PyPIClient:
             try:
                 package_info = await self.get_package_info(query)
                 if package_info:
-                    results.append({
-                        'name': query,
-                        'summary': package_info.get('info', {}).get('summary'),
-                        'version': package_info.get('info', {}).get('version'),
-                        'description': package_info.get('info', {}).get('description'),
-                        'author': package_info.get('info', {}).get('author'),
-                    })
+                    results.append(_search_result(query, package_info))
                     seen_packages.add(query.lower())
             except Exception as e:
                 logger.debug(f"Direct lookup failed for {query}: {e}")
         
-        # Search through popular packages
-        popular_packages = [
-            'requests', 'numpy', 'pandas', 'django', 'flask', 'fastapi',
-            'pytest', 'setuptools', 'wheel', 'pip', 'black', 'flake8',
-            'mypy', 'click', 'pydantic', 'sqlalchemy', 'alembic', 'jinja2',
-            'matplotlib', 'seaborn', 'scikit-learn', 'tensorflow', 'torch',
-            'opencv-python', 'pillow', 'beautifulsoup4', 'lxml', 'httpx',
-            'aiohttp', 'boto3', 'celery', 'redis', 'psycopg2', 'pymongo',
-            'selenium', 'scrapy', 'jupyter', 'ipython', 'notebook', 'uvicorn',
-            'gunicorn', 'asyncio', 'typing-extensions', 'pyyaml', 'toml',
-            'rich', 'typer', 'poetry', 'pipenv', 'virtualenv', 'tox'
-        ]
+        # Search through popular packages: rank the matching names first, then
+        # fetch only as many as there are open slots, concurrently
+        candidates = sorted(
+            (
+                package_name for package_name in POPULAR_PACKAGES
+                if query_lower in package_name and package_name not in seen_packages
+            ),
+            key=lambda package_name: _match_rank(query_lower, package_name)
+        )[:max(0, limit - len(results))]
+        package_infos = await self._get_package_infos(candidates)
         
-        for package_name in popular_packages:
-            if (len(results) >= limit or 
-                package_name.lower() in seen_packages or
-                query_lower not in package_name.lower()):
-                continue
-                
-            try:
-                package_info = await self.get_package_info(package_name)
-                if package_info:
-                    results.append({
-                        'name': package_name,
-                        'summary': package_info.get('info', {}).get('summary'),
-                        'version': package_info.get('info', {}).get('version'),
-                        'description': package_info.get('info', {}).get('description'),
-                        'author': package_info.get('info', {}).get('author'),
-                    })
-                    seen_packages.add(package_name.lower())
-            except Exception as e:
-                logger.debug(f"Failed to get info for popular package {package_name}: {e}")
-                # Add basic entry even if we can't get full info
-                if len(results) < limit:
-                    results.append({
-                        'name': package_name,
-                        'summary': f"Popular Python package: {package_name}",
-                        'version': 'latest',
-                        'description': None,
-                        'author': None,
-                    })
-                    seen_packages.add(package_name.lower())
+        for package_name, package_info in zip(candidates, package_infos):
+            if isinstance(package_info, Exception):
+                logger.debug(f"Failed to get info for popular package {package_name}: {package_info}")
+            elif package_info:
+                results.append(_search_result(package_name, package_info))
+                seen_packages.add(package_name.lower())
         
         # If we haven't filled our limit, try searching common package patterns
         if len(results) < limit:
@@ -520,26 +837,18 @@ class PyPIClient:
             f"{query_lower}3"
         ]
         
-        for pattern in patterns:
+        # Look the unseen patterns up concurrently, then keep them in pattern order
+        patterns = [pattern for pattern in dict.fromkeys(patterns) if pattern not in seen_packages]
+        package_infos = await self._get_package_infos(patterns)
+        
+        for pattern, package_info in zip(patterns, package_infos):
             if len(results) >= limit:
                 break
-                
-            if pattern in seen_packages:
-                continue
-                
-            try:
-                package_info = await self.get_package_info(pattern)
-                if package_info:
-                    results.append({
-                        'name': pattern,
-                        'summary': package_info.get('info', {}).get('summary'),
-                        'version': package_info.get('info', {}).get('version'),
-                        'description': package_info.get('info', {}).get('description'),
-                        'author': package_info.get('info', {}).get('author'),
-                    })
-                    seen_packages.add(pattern)
-            except Exception as e:
-                logger.debug(f"Pattern search failed for {pattern}: {e}")
+            if isinstance(package_info, Exception):
+                logger.debug(f"Pattern search failed for {pattern}: {package_info}")
+            elif package_info:
+                results.append(_search_result(pattern, package_info))
+                seen_packages.add(pattern)
     
     async def _search_simple_index(self, query: str, index_url: str, limit: int) -> List[Dict[str, Any]]:
         """Search through simple index package list"""
@@ -550,25 +859,51 @@ class PyPIClient:
         
         # Simple text-based search
         query_lower = query.lower()
+        lowered_names = self._lowered_simple_index(index_url, package_list)
+        matching_names = (
+            package_name for package_name, lowered_name in zip(package_list, lowered_names)
+            if query_lower in lowered_name
+        )
         matches = []
         
-        for package_name in package_list:
-            if query_lower in package_name.lower():
-                # Get basic package info
-                package_info = await self.get_package_info(package_name, index_url)
-                if package_info:
-                    matches.append({
-                        'name': package_name,
-                        'summary': package_info.get('info', {}).get('summary'),
-                        'version': package_info.get('info', {}).get('version'),
-                        'description': package_info.get('info', {}).get('description'),
-                    })
-                
-                if len(matches) >= limit:
-                    break
+        # Fetch info for as many names as there are open slots at a time, so
+        # lookups run concurrently without fetching far past the limit
+        while len(matches) < limit:
+            batch = list(islice(matching_names, limit - len(matches)))
+            if not batch:
+                break
+            package_infos = await self._get_package_infos(batch, index_url)
+            for package_name, package_info in zip(batch, package_infos):
+                if isinstance(package_info, Exception):
+                    logger.debug(f"Failed to get info for {package_name}: {package_info}")
+                elif package_info:
+                    matches.append(_search_result(package_name, package_info))
         
         return matches
     
+    def _lowered_simple_index(self, index_url: str, package_list: List[str]) -> List[str]:
+        """
+        Lowercased package names, parallel to package_list
+        
+        Built once per cached index list and kept alongside it, so searches
+        don't lowercase hundreds of thousands of names on every query.
+        """
+        cache_entry = self._simple_index_cache.get(index_url)
+        if cache_entry is None or cache_entry['packages'] is not package_list:
+            return [package_name.lower() for package_name in package_list]
+        
+        lowered_names = cache_entry.get('lowered')
+        if lowered_names is None:
+            lowered_names = cache_entry['lowered'] = [package_name.lower() for package_name in package_list]
+        return lowered_names
+    
+    async def _get_package_infos(self, package_names: List[str], index_url: str = "https://pypi.org") -> List[Any]:
+        """Fetch package info for several packages concurrently (exceptions are returned in place)"""
+        return await asyncio.gather(
+            *(self.get_package_info(package_name, index_url) for package_name in package_names),
+            return_exceptions=True
+        )
+    
     async def get_simple_index_packages(self, index_url: str) -> List[str]:
         """
         Get list of all packages from simple index
@@ -578,24 +913,22 @@ class PyPIClient:
         cache_key = index_url
         
         # Check cache first
-        if cache_key in self._simple_index_cache:
-            cache_entry = self._simple_index_cache[cache_key]
-            # Cache for 1 hour
-            if time.time() - cache_entry['timestamp'] < 3600:
-                return cache_entry['packages']
+        cache_entry = self._simple_index_cache.get(cache_key)
+        # Cache for 1 hour
+        if cache_entry and time.monotonic() - cache_entry['timestamp'] < 3600:
+            return cache_entry['packages']
         
         simple_url = urljoin(index_url, "/simple/")
         
-        # Try JSON format first (PEP 691)
-        packages = await self._get_simple_index_json(simple_url)
-        if packages is not None:
+        # Try JSON format first (PEP 691); a stale entry is revalidated and
+        # comes back as is when the index reports no change
+        json_entry = await self._get_simple_index_json(simple_url, cache_entry)
+        if json_entry is not None:
             # Cache the result
-            self._simple_index_cache[cache_key] = {
-                'packages': packages,
-                'timestamp': time.time()
-            }
-            logger.info(f"Found {len(packages)} packages in {index_url} (JSON)")
-            return packages
+            json_entry['timestamp'] = time.monotonic()
+            self._simple_index_cache[cache_key] = json_entry
+            logger.info(f"Found {len(json_entry['packages'])} packages in {index_url} (JSON)")
+            return json_entry['packages']
         
         # Fall back to HTML parsing
         packages = await self._get_simple_index_html(simple_url)
@@ -603,30 +936,53 @@ class PyPIClient:
             # Cache the result
             self._simple_index_cache[cache_key] = {
                 'packages': packages,
-                'timestamp': time.time()
+                'timestamp': time.monotonic()
             }
             logger.info(f"Found {len(packages)} packages in {index_url} (HTML)")
         
         return packages
     
-    async def _get_simple_index_json(self, simple_url: str) -> Optional[List[str]]:
-        """Get package list using JSON API (PEP 691)"""
-        await self._ensure_session()
-        await self._rate_limit()
+    async def _get_simple_index_json(self, simple_url: str, stale_entry: Optional[Dict] = None) -> Optional[Dict]:
+        """
+        Get package list using JSON API (PEP 691)
+        
+        Returns a cache entry with the packages and the response's ETag and
+        Last-Modified validators. When stale_entry carries validators the
+        request is conditional, and on 304 Not Modified stale_entry itself is
+        returned without downloading the list again.
+        """
+        if not self._json_api_supported(simple_url):
+            return None
+        
+        headers = {
+            'Accept': 'application/vnd.pypi.simple.v1+json',
+            'User-Agent': 'py-reqforge/1.0.0 (PyPI package manager)'
+        }
+        if stale_entry:
+            if stale_entry.get('etag'):
+                headers['If-None-Match'] = stale_entry['etag']
+            if stale_entry.get('last_modified'):
+                headers['If-Modified-Since'] = stale_entry['last_modified']
+        
+        response = await self._send_json_request(simple_url, headers)
+        if response is None:
+            return None
         
         try:
-            response = await self.session.get(
-                simple_url,
-                headers={
-                    'Accept': 'application/vnd.pypi.simple.v1+json',
-                    'User-Agent': 'py-reqforge/1.0.0 (PyPI package manager)'
-                }
-            )
+            if response.status_code == 304 and stale_entry:
+                logger.info(f"Simple index {simple_url} not modified")
+                return stale_entry
+            
+            self._record_json_support(simple_url, response)
             
             if response.status_code == 200:
-                data = response.json()
+                data = orjson.loads(response.content)
                 projects = data.get('projects', [])
-                return [project['name'] for project in projects if isinstance(project, dict) and 'name' in project]
+                return {
+                    'packages': [project['name'] for project in projects if isinstance(project, dict) and 'name' in project],
+                    'etag': response.headers.get('etag'),
+                    'last_modified': response.headers.get('last-modified'),
+                }
             
         except Exception as e:
             logger.debug(f"JSON simple index request failed: {e}")
@@ -641,13 +997,9 @@ class PyPIClient:
             return []
         
         try:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            links = soup.find_all('a')
-            
             packages = []
-            for link in links:
+            for link, package_name in _iter_links(response.content):
                 href = link.get('href', '')
-                package_name = link.get_text().strip()
                 
                 # Basic validation
                 if package_name and not href.startswith('http'):
@@ -671,12 +1023,9 @@ class PyPIClient:
             if not response:
                 return False
             
-            # Check if it looks like a package index
-            soup = BeautifulSoup(response.text, 'html.parser')
-            links = soup.find_all('a')
-            
-            # Should have at least some links that look like package names
-            return len(links) > 0
+            # Check if it looks like a package index: it should have at least
+            # some links that look like package names (stops at the first)
+            return next(_iter_links(response.content), None) is not None
             
         except Exception as e:
             logger.error(f"Index validation failed for {index_url}: {e}")
@@ -720,31 +1069,18 @@ class PyPIClient:
         Example: "requests>=2.25.0,<3.0.0; python_version>='3.6'"
         """
         try:
-            # Basic parsing - in production, use packaging.requirements
-            parts = requirement.split(';')
-            main_part = parts[0].strip()
-            
-            # Extract package name and version spec
-            if '>=' in main_part or '<=' in main_part or '==' in main_part or '>' in main_part or '<' in main_part or '!=' in main_part:
-                for op in ['>=', '<=', '==', '!=', '>', '<', '~=']:
-                    if op in main_part:
-                        name, version_spec = main_part.split(op, 1)
-                        return {
-                            'name': name.strip(),
-                            'version_spec': f"{op}{version_spec.strip()}",
-                            'optional': False,
-                            'extra': None
-                        }
-            else:
-                # No version specification
-                return {
-                    'name': main_part.strip(),
-                    'version_spec': None,
-                    'optional': False,
-                    'extra': None
-                }
-                
-        except Exception as e:
+            name, version_spec, marker, extras = _split_requirement(requirement)
+        except InvalidRequirement as e:
             logger.error(f"Failed to parse requirement '{requirement}': {e}")
-            
-        return None
\ No newline at end of file
+            return None
+        
+        # Dependencies gated on an extra are optional, e.g. `extra == "socks"`
+        extra_match = _EXTRA_MARKER_RE.search(marker) if marker else None
+        return {
+            'name': name,
+            'version_spec': version_spec,
+            'optional': extra_match is not None,
+            'extra': extra_match.group(1) if extra_match else None,
+            'marker': marker,
+            'extras': list(extras) or None
+        }
\ No newline at end of file